@@ -0,0 +1,110 @@
+"""
+Compare the CSV text and binary COPY encodings used by ingest.
+
+Encoding is measured offline on synthetic rows. With --copy, both payloads are
+also loaded into a temporary copy of raw_item to time the server side:
+
+    python -m benchmarks.bench_copy_encoding --rows 20000 --copy
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sqlmodel import Session
+
+from core.database import engine
+from services.item import INGEST_COLUMNS, encode_binary_batch, encode_csv_batch
+from services.pg_copy import BINARY_HEADER, BINARY_TRAILER, IteratorStream
+
+
+def synthetic_rows(n: int, dim: int, seed: int = 0) -> tuple[list[dict], np.ndarray]:
+    rng = np.random.default_rng(seed)
+    rows = [
+        {
+            "business_id": f"SKU-{i}",
+            "name": f"Notebook Inspiron 15 8GB Intel i5 {i}",
+            "brand_name": "Dell",
+            "description": "15.6\" Intel Core i5 8GB RAM SSD 256GB Windows 11",
+            "price": f"{rng.uniform(10, 9999):.2f}",
+            "stock": str(int(rng.integers(0, 500))),
+            "category": "8471.30.00",
+            "unit_type": "UN",
+        }
+        for i in range(n)
+    ]
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return rows, embeddings
+
+
+def encode(copy_format: str, rows: list[dict], embeddings: np.ndarray, batch_size: int) -> list[bytes]:
+    chunks = []
+    if copy_format == "binary":
+        chunks.append(BINARY_HEADER)
+    else:
+        chunks.append((",".join(INGEST_COLUMNS) + "\r\n").encode("utf-8"))
+
+    for start in range(0, len(rows), batch_size):
+        batch_rows = rows[start:start + batch_size]
+        batch_embeddings = embeddings[start:start + batch_size]
+        if copy_format == "binary":
+            chunks.append(encode_binary_batch(batch_rows, batch_embeddings))
+        else:
+            chunks.append(encode_csv_batch(batch_rows, batch_embeddings))
+
+    if copy_format == "binary":
+        chunks.append(BINARY_TRAILER)
+    return chunks
+
+
+def time_copy(copy_format: str, chunks: list[bytes]) -> float:
+    """COPY the payload into a temporary table shaped like raw_item and roll back."""
+    with Session(engine) as db:
+        db.connection().exec_driver_sql(
+            "CREATE TEMP TABLE bench_raw_item (LIKE raw_item INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        start = time.perf_counter()
+        raw_conn = db.connection().connection
+        raw_conn.cursor().copy_expert(
+            f"COPY bench_raw_item ({', '.join(INGEST_COLUMNS)}) FROM STDIN WITH "
+            + ("(FORMAT BINARY)" if copy_format == "binary" else "(FORMAT CSV, HEADER)"),
+            IteratorStream(iter(chunks)),
+        )
+        elapsed = time.perf_counter() - start
+        db.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--copy", action="store_true", help="also time COPY against the configured database")
+    args = parser.parse_args()
+
+    rows, embeddings = synthetic_rows(args.rows, args.dim)
+
+    report = {"rows": args.rows, "dim": args.dim, "formats": {}}
+    for copy_format in ("csv", "binary"):
+        start = time.perf_counter()
+        chunks = encode(copy_format, rows, embeddings, args.batch_size)
+        encode_seconds = time.perf_counter() - start
+
+        result = {
+            "encode_seconds": round(encode_seconds, 4),
+            "encode_rows_per_second": round(args.rows / encode_seconds),
+            "payload_bytes": sum(len(c) for c in chunks),
+        }
+        if args.copy:
+            copy_seconds = time_copy(copy_format, chunks)
+            result["copy_seconds"] = round(copy_seconds, 4)
+            result["copy_rows_per_second"] = round(args.rows / copy_seconds)
+        report["formats"][copy_format] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+End-to-end ingest, link and search benchmark on synthetic catalogs.
+
+For every size a catalog is generated with benchmarks.synthetic_catalog, the
+database is emptied, the CSVs are ingested in uploads of --upload-rows rows,
+link_job runs --link-repeats times for every --link-workers count and
+--queries searches are issued. The local hashing embedder stands in for
+OpenAI. Results, including throughput, p50/p99 latency per operation and
+pairwise link precision/recall against the generated truth, are printed as
+JSON:
+
+    python -m benchmarks.bench_e2e --sizes 10000,100000 --reset --output bench.json
+
+--reset is required: every size starts by truncating raw_item and dropping
+all cluster runs of the configured database.
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import Session, text
+
+from core.config import settings
+from core.database import async_engine, create_db_and_tables, engine
+from services.cluster_cache import cluster_cache
+from services.item import ingest_items_csv, search_items_with_clusters
+from services.link_job import LinkProgress, get_active_run, link_job
+from services.snapshot import delete_runs, load_snapshot
+
+from benchmarks.synthetic_catalog import generate_catalog, perturb_text
+
+
+class TimingProgress(LinkProgress):
+    """Records the duration of every link stage."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.seconds[name] = time.perf_counter() - start
+
+
+def latency_summary(seconds: list[float], units: int | None = None) -> dict:
+    """Count, throughput and latency percentiles (ms) of a list of timings."""
+    values = np.array(seconds)
+    total = float(values.sum())
+    summary = {
+        "count": len(values),
+        "total_seconds": round(total, 4),
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 3),
+        "max_ms": round(float(values.max()) * 1000, 3),
+    }
+    if units is not None and total > 0:
+        summary["per_second"] = round(units / total, 1)
+    return summary
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_database():
+    with engine.begin() as conn:
+        run_ids = conn.execute(text("SELECT cluster_run_id FROM cluster_run")).scalars().all()
+        delete_runs(conn, list(run_ids))
+        conn.execute(text("TRUNCATE raw_item, cluster_run RESTART IDENTITY CASCADE"))
+    cluster_cache.invalidate()
+
+
+def split_csv(path: str, rows_per_file: int, out_dir: str) -> list[tuple[str, int]]:
+    """Split a CSV into files of rows_per_file rows, each with the header."""
+    parts = []
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        for index in itertools.count():
+            chunk = list(itertools.islice(reader, rows_per_file))
+            if not chunk:
+                break
+            part = os.path.join(out_dir, f"{os.path.basename(path)[:-4]}_{index:05d}.csv")
+            with open(part, "w", newline="", encoding="utf-8") as out:
+                writer = csv.writer(out)
+                writer.writerow(header)
+                writer.writerows(chunk)
+            parts.append((part, len(chunk)))
+    return parts
+
+
+def bench_ingest(catalog: dict, upload_rows: int, work_dir: str) -> dict:
+    uploads = [
+        part
+        for source in ("t1", "t2")
+        for part in split_csv(catalog["paths"][source], upload_rows, work_dir)
+    ]
+    seconds = []
+    for path, _ in uploads:
+        with open(path, "rb") as f, Session(engine) as db:
+            upload = UploadFile(file=f, filename=os.path.basename(path), size=os.path.getsize(path))
+            start = time.perf_counter()
+            ingest_items_csv(db=db, file=upload)
+            seconds.append(time.perf_counter() - start)
+
+    return {
+        "upload_rows": upload_rows,
+        **latency_summary(seconds, units=sum(rows for _, rows in uploads)),
+    }
+
+
+def link_quality(catalog: dict) -> dict:
+    """Pairwise precision/recall of the active run against the generated truth."""
+    with open(catalog["paths"]["truth"], newline="", encoding="utf-8") as f:
+        truth = {row["business_id"]: int(row["product_id"]) for row in csv.DictReader(f)}
+
+    with engine.connect() as conn:
+        run = get_active_run(conn)
+        item_ids, cluster_ids = load_snapshot(conn, run["cluster_run_id"])
+        business = dict(conn.execute(text("SELECT id, business_id FROM raw_item")).fetchall())
+
+    products = np.array([truth[business[i]] for i in item_ids.tolist()], dtype=np.int64)
+
+    def pair_count(*keys: np.ndarray) -> int:
+        _, counts = np.unique(np.column_stack(keys), axis=0, return_counts=True)
+        return int((counts * (counts - 1) // 2).sum())
+
+    true_pairs = pair_count(products)
+    linked_pairs = pair_count(cluster_ids)
+    correct_pairs = pair_count(products, cluster_ids)
+    return {
+        "true_pairs": true_pairs,
+        "linked_pairs": linked_pairs,
+        "precision": round(correct_pairs / linked_pairs, 4) if linked_pairs else None,
+        "recall": round(correct_pairs / true_pairs, 4) if true_pairs else None,
+    }
+
+
+def bench_link(catalog: dict, repeats: int, mode: str, workers: int) -> dict:
+    settings.link_workers = workers
+    seconds = []
+    stages: dict[str, list[float]] = {}
+    run = None
+    for _ in range(repeats):
+        progress = TimingProgress()
+        start = time.perf_counter()
+        run = link_job(mode, progress=progress)
+        seconds.append(time.perf_counter() - start)
+        for name, value in progress.seconds.items():
+            stages.setdefault(name, []).append(value)
+
+    return {
+        "mode": mode,
+        "link_workers": workers,
+        **latency_summary(seconds, units=run["item_count"] * repeats),
+        "stages_p50_ms": {
+            name: round(float(np.percentile(values, 50)) * 1000, 3) for name, values in stages.items()
+        },
+        "item_count": run["item_count"],
+        "cluster_count": run["cluster_count"],
+        "candidate_pairs": run["candidate_pairs"],
+        "snapshot_rows": run["snapshot_rows"],
+        "quality": link_quality(catalog),
+    }
+
+
+def search_queries(catalog: dict, count: int, seed: int) -> list[str]:
+    """Noisy product names drawn from the generated listings."""
+    rng = random.Random(seed)
+    names = []
+    for source, column in (("t1", "produto"), ("t2", "nome_do_item")):
+        with open(catalog["paths"][source], newline="", encoding="utf-8") as f:
+            names += [row[column] for row in itertools.islice(csv.DictReader(f), count * 10)]
+    return [perturb_text(rng.choice(names), rng) for _ in range(count)]
+
+
+async def bench_search(queries: list[str], top_k: int, concurrency: int) -> dict:
+    # The first search loads the active run's membership into the cluster cache
+    async with AsyncSession(async_engine) as db:
+        start = time.perf_counter()
+        await search_items_with_clusters(db=db, query=queries[0], top_k=top_k)
+        warmup = time.perf_counter() - start
+
+    pending = iter(queries)
+    seconds = []
+
+    async def worker():
+        async with AsyncSession(async_engine) as db:
+            for query in pending:
+                start = time.perf_counter()
+                await search_items_with_clusters(db=db, query=query, top_k=top_k)
+                seconds.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    return {
+        "top_k": top_k,
+        "concurrency": concurrency,
+        "warmup_ms": round(warmup * 1000, 3),
+        **latency_summary(seconds),
+        "per_second": round(len(seconds) / wall, 1),
+    }
+
+
+async def run_sizes(args) -> list[dict]:
+    """
+    Benchmark every size. One event loop serves all sizes, since the async
+    engine pool and the cluster cache are bound to the loop that first used them;
+    ingest and link calls simply block it.
+    """
+    link_workers = [int(w) for w in args.link_workers.split(",")] if args.link_workers else [settings.link_workers]
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as work_dir:
+            catalog = generate_catalog(size, work_dir, args.duplicate_rate, args.max_cluster_size, args.seed)
+            reset_database()
+
+            result = {"rows": size, "products": catalog["products"]}
+            result["ingest"] = bench_ingest(catalog, args.upload_rows, work_dir)
+            result["link"] = [
+                bench_link(catalog, args.link_repeats, args.link_mode, workers)
+                for workers in link_workers
+            ]
+            queries = search_queries(catalog, args.queries, args.seed)
+            result["search"] = await bench_search(queries, args.top_k, args.concurrency)
+
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--duplicate-rate", type=float, default=0.3)
+    parser.add_argument("--max-cluster-size", type=int, default=4)
+    parser.add_argument("--upload-rows", type=int, default=10_000, help="Rows per ingest_items_csv call")
+    parser.add_argument("--link-repeats", type=int, default=3)
+    parser.add_argument("--link-mode", choices=("full", "incremental"), default="full")
+    parser.add_argument(
+        "--link-workers", help="Comma-separated link_workers counts to sweep, defaults to settings.link_workers"
+    )
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent search sessions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="Allow emptying raw_item and cluster runs")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    if not args.reset:
+        parser.error("--reset is required: the benchmark empties raw_item and drops every cluster run")
+
+    # Offline embeddings, also picked up by spawned link workers
+    settings.embedding_provider = "local"
+    os.environ["EMBEDDING_PROVIDER"] = "local"
+
+    create_db_and_tables()
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "settings": {
+            "embedding_provider": settings.embedding_provider,
+            "embedding_dimensions": settings.embedding_dimensions,
+            "embedding_storage": settings.embedding_storage,
+            "ingest_copy_format": settings.ingest_copy_format,
+            "ingest_mode": settings.ingest_mode,
+            "candidate_mode": settings.candidate_mode,
+            "score_pushdown": settings.score_pushdown,
+            "link_workers": settings.link_workers,
+            "snapshot_storage": settings.snapshot_storage,
+            "search_mode": settings.search_mode,
+            "cluster_centroids": settings.cluster_centroids,
+        },
+    }
+
+    report["results"] = asyncio.run(run_sizes(args))
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
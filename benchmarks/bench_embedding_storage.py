@@ -0,0 +1,98 @@
+"""
+Recall and latency of compact embedding layouts against float32 at full width.
+
+For each storage (vector / halfvec) and dimension, vectors are truncated to
+the leading components, re-normalised and rounded to the storage precision,
+and brute-force cosine top-k is compared with the float32 full-width top-k.
+
+By default the catalog is synthetic, with variance concentrated in the leading
+dimensions as in Matryoshka-trained models. Use --from-db to read real
+embeddings from raw_item before migrating:
+
+    python -m benchmarks.bench_embedding_storage --from-db --queries 500
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sqlmodel import text
+
+from core.database import engine
+from services.embedding import _parse_vector
+
+
+def synthetic_catalog(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(np.arange(1, dim + 1, dtype=np.float32))
+    centers = rng.standard_normal((max(n // 5, 1), dim)).astype(np.float32) * scale
+    catalog = centers[rng.integers(0, len(centers), n)]
+    catalog += 0.3 * rng.standard_normal((n, dim)).astype(np.float32) * scale
+    return catalog
+
+
+def catalog_from_db(limit: int) -> np.ndarray:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT name_description_embedding FROM raw_item ORDER BY id LIMIT :limit"),
+            {"limit": limit},
+        ).fetchall()
+    return np.stack([_parse_vector(row[0]) for row in rows])
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def top_k(catalog: np.ndarray, queries: np.ndarray, k: int) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    scores = queries @ catalog.T
+    idx = np.argpartition(-scores, k, axis=1)[:, :k]
+    elapsed = time.perf_counter() - start
+    return idx, elapsed / len(queries)
+
+
+def recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 1024, 768, 512, 256])
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    catalog = catalog_from_db(args.rows) if args.from_db else synthetic_catalog(args.rows, max(args.dims))
+    catalog = normalize(catalog.astype(np.float32))
+    rng = np.random.default_rng(1)
+    queries = catalog[rng.choice(len(catalog), args.queries, replace=False)]
+    queries = normalize(queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32))
+
+    top_k(catalog, queries, args.k)  # warm-up
+    truth, baseline_latency = top_k(catalog, queries, args.k)
+
+    report = {"rows": len(catalog), "queries": args.queries, "k": args.k, "layouts": []}
+    for storage, dtype in (("vector", np.float32), ("halfvec", np.float16)):
+        for dim in args.dims:
+            if dim > catalog.shape[1]:
+                continue
+            stored = normalize(catalog[:, :dim]).astype(dtype).astype(np.float32)
+            query = normalize(queries[:, :dim])
+            found, latency = top_k(stored, query, args.k)
+            report["layouts"].append({
+                "storage": f"{storage}({dim})",
+                "bytes_per_row": 4 + dim * np.dtype(dtype).itemsize,
+                f"recall@{args.k}": round(recall(truth, found), 4),
+                "query_ms": round(latency * 1000, 3),
+                "relative_latency": round(latency / baseline_latency, 3),
+            })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Synthetic t1/t2 supplier CSVs seeded from clustered_items.csv.
+
+Each synthetic product is a seed item with its own model code and price, so
+products from the same seed are near-duplicates that must not link. A share
+of products (--duplicate-rate) is listed several times across both suppliers
+with noisy names, descriptions and prices; those listings form the true
+clusters, written to truth.csv (source, business_id, product_id).
+
+    python -m benchmarks.synthetic_catalog --rows 100000 --out /tmp/catalog
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import string
+from decimal import Decimal
+
+from core.config import settings
+
+SEED_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clustered_items.csv")
+
+ABBREVIATIONS = {
+    "notebook": "note",
+    "polegadas": "pol",
+    "smartphone": "smart",
+    "monitor": "mon",
+    "teclado": "tecl",
+    "processador": "proc",
+    "memoria": "mem",
+    "memória": "mem",
+    "preto": "pto",
+    "branco": "bco",
+}
+
+
+def load_seed_items(path: str = SEED_CSV) -> list[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            {
+                "name": row["name"],
+                "brand_name": row["brand_name"],
+                "description": row["description"],
+                "price": Decimal(row["price"]),
+                "category": row["category"],
+                "unit_type": row["unit_type"],
+            }
+            for row in csv.DictReader(f)
+            if row["name"] and row["price"]
+        ]
+
+
+def model_code(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_uppercase, k=2)) + str(rng.randint(100, 9999))
+
+
+def perturb_text(value: str, rng: random.Random) -> str:
+    """Listing noise: abbreviations, casing, a dropped word, swapped words."""
+    words = value.split()
+    words = [ABBREVIATIONS.get(w.lower(), w) if rng.random() < 0.3 else w for w in words]
+    if len(words) > 4 and rng.random() < 0.3:
+        del words[rng.randrange(1, len(words))]
+    if len(words) > 3 and rng.random() < 0.3:
+        i = rng.randrange(1, len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    text_ = " ".join(words)
+    roll = rng.random()
+    if roll < 0.15:
+        return text_.upper()
+    if roll < 0.3:
+        return text_.lower()
+    return text_
+
+
+def iter_listings(rows: int, duplicate_rate: float, max_cluster_size: int, seed: int):
+    """Yield (product_id, listing dict) until `rows` listings were produced."""
+    rng = random.Random(seed)
+    seeds = load_seed_items()
+
+    produced = 0
+    product_id = 0
+    while produced < rows:
+        base = seeds[product_id % len(seeds)]
+        code = model_code(rng)
+        price = base["price"] * Decimal(str(round(rng.uniform(0.5, 2.0), 2)))
+        product = {
+            "name": f"{base['name']} {code}",
+            "brand_name": base["brand_name"],
+            "description": f"{base['description']} Modelo {code}",
+            "category": base["category"],
+            "unit_type": base["unit_type"],
+        }
+
+        size = rng.randint(2, max_cluster_size) if rng.random() < duplicate_rate else 1
+        for copy in range(min(size, rows - produced)):
+            noisy = copy > 0
+            yield product_id, {
+                **product,
+                "name": perturb_text(product["name"], rng) if noisy else product["name"],
+                "description": perturb_text(product["description"], rng) if noisy else product["description"],
+                # Within the 0.7–1.3 price band of the similarity query
+                "price": (price * Decimal(str(round(rng.uniform(0.9, 1.1), 3)))).quantize(Decimal("0.01")),
+            }
+            produced += 1
+        product_id += 1
+
+
+def generate_catalog(
+    rows: int,
+    out_dir: str,
+    duplicate_rate: float = 0.3,
+    max_cluster_size: int = 4,
+    seed: int = 0,
+) -> dict:
+    """Write t1.csv, t2.csv and truth.csv to out_dir and return a summary."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed + 1)
+    paths = {name: os.path.join(out_dir, f"{name}.csv") for name in ("t1", "t2", "truth")}
+    t1_columns = {field: column for column, field in settings.t1_mapping.items()}
+    t2_columns = {field: column for column, field in settings.t2_mapping.items()}
+
+    counts = {"t1": 0, "t2": 0}
+    products = 0
+    with (
+        open(paths["t1"], "w", newline="", encoding="utf-8") as t1_file,
+        open(paths["t2"], "w", newline="", encoding="utf-8") as t2_file,
+        open(paths["truth"], "w", newline="", encoding="utf-8") as truth_file,
+    ):
+        writers = {
+            "t1": (csv.DictWriter(t1_file, fieldnames=list(settings.t1_mapping)), t1_columns),
+            "t2": (csv.DictWriter(t2_file, fieldnames=list(settings.t2_mapping)), t2_columns),
+        }
+        for writer, _ in writers.values():
+            writer.writeheader()
+        truth = csv.writer(truth_file)
+        truth.writerow(["source", "business_id", "product_id"])
+
+        for product_id, listing in iter_listings(rows, duplicate_rate, max_cluster_size, seed):
+            source = "t1" if rng.random() < 0.5 else "t2"
+            counts[source] += 1
+            business_id = f"{source.upper()}-{counts[source]:07d}"
+            fields = {**listing, "business_id": business_id, "stock": rng.randint(0, 500)}
+
+            writer, columns = writers[source]
+            writer.writerow({columns[field]: fields[field] for field in columns})
+            truth.writerow([source, business_id, product_id])
+            products = product_id + 1
+
+    return {"rows": rows, "products": products, **counts, "paths": paths}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--duplicate-rate", type=float, default=0.3, help="Share of products listed more than once")
+    parser.add_argument("--max-cluster-size", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate_catalog(args.rows, args.out, args.duplicate_rate, args.max_cluster_size, args.seed)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 from pydantic_settings import BaseSettings
-from openai import OpenAI
 from dotenv import load_dotenv
 import numpy as np
 
@@ -8,12 +7,67 @@ load_dotenv(override=True)
 class AppSettings(BaseSettings):
     """Application settings using Pydantic."""
 
-    max_size: int = 20 * 1024 * 1024  # 20MB
+    max_size: int | None = None  # Optional upload ceiling in bytes; ingest streams, so none is needed
+    ingest_batch_size: int = 1000  # Rows read, embedded and copied per batch
+    ingest_copy_format: str = "binary"  # "binary" sends float32 vectors as-is, "csv" sends their text form
+    ingest_mode: str = "upsert"  # "upsert" keys rows on (supplier, business_id) and skips unchanged ones, "append" always inserts
+
+    embedding_provider: str = "openai"  # "openai" or "local" (offline character n-gram hashing)
+    embedding_model: str = "text-embedding-3-small"
+    embedding_dimensions: int = 1536  # Stored dimensions; below 1536, text-embedding-3 returns Matryoshka-truncated vectors
+    embedding_storage: str = "vector"  # "vector" (float32) or "halfvec" (float16) for name_description_embedding
+    local_embedding_ngram_sizes: list[int] = [3, 4, 5]  # Character n-gram sizes hashed by the local provider
+    embedding_cache_size: int = 10_000  # Embeddings kept in the in-process LRU, about 6 KB each at 1536 float32 dimensions, per process
+    embedding_cache_lookup_batch: int = 1000  # Hashes per embedding_cache query
+    embedding_max_batch_size: int = 2048  # Inputs per embeddings request
+    embedding_max_batch_tokens: int = 200_000  # Estimated tokens per embeddings request
+    embedding_chars_per_token: float = 3.0  # Conservative estimate for Portuguese text
+    embedding_concurrency: int = 4  # Embedding requests in flight at once
+    embedding_max_retries: int = 6  # Retries on 429, 5xx and connection errors
+    embedding_backoff_base: float = 1.0  # Seconds, doubled on every retry
+    embedding_backoff_max: float = 60.0
 
     w_vector : np.ndarray = np.array([-4.48104801, -3.03940367])  # Weights for name and description similarity
     
     bias: float = np.float64(3.966662191711139)  # Bias term for SVM
 
+    link_model: str = "svm"  # "svm" links pairs with X·w + bias <= 0, "threshold" links pairs above both similarity thresholds
+    name_threshold: float = 0.5  # Minimum sim_name for the threshold model
+    desc_threshold: float = 0.3  # Minimum sim_desc for the threshold model
+    score_pushdown: bool = True  # Apply the link model inside the candidate query so Postgres only returns edges
+
+    link_mode: str = "full"  # "full" rebuilds every cluster, "incremental" only scores items missing from the last run
+
+    link_job_history: int = 50  # Link jobs kept in the link_job table for status polling
+    link_job_poll_seconds: float = 5.0  # How often an idle runner checks link_job for jobs queued through other workers
+    link_job_stale_seconds: float = 60.0  # Running jobs whose worker has not touched them for this long are failed
+    link_cancel_grace_seconds: float = 30.0  # Wait for a cancelled run to stop at a stage boundary before killing it
+
+    snapshot_storage: str = "delta"  # "full" writes every item per run, "delta" only items whose cluster changed since the active run
+    snapshot_max_delta_chain: int = 10  # Runs in a delta chain before the next run is written in full
+    cluster_centroids: bool = True  # Materialise per-run cluster centroids with an HNSW index, used by "cluster" search
+
+    timing_logs: bool = False  # Emit one JSON timing line per HTTP request, ingest and link job on the "timing" logger
+
+    cluster_cache_ttl_seconds: float = 5.0  # How often search re-checks the active cluster_run pointer
+    search_mode: str = "vector"  # "vector" ranks by embedding distance, "hybrid" fuses it with trigram matches on name/description, "cluster" ranks the members of the nearest cluster centroids
+    search_cluster_candidates: int = 20  # Nearest centroids whose members are ranked in "cluster" search
+    search_candidates: int = 50  # Hits per leg fused by hybrid search; also the floor for hnsw.ef_search during search
+    search_rrf_k: int = 60  # Reciprocal-rank fusion constant, score = sum(1 / (k + rank)) over both legs
+    search_trigram_threshold: float = 0.5  # pg_trgm.word_similarity_threshold of the lexical leg
+    search_iterative_scan: str = "strict_order"  # hnsw.iterative_scan, keeps scanning the HNSW index until filtered searches fill top_k; "off" to disable
+    search_max_scan_tuples: int = 20_000  # hnsw.max_scan_tuples; filtered searches that stop short fall back to an exact scan of the matching rows
+    search_max_associated_items: int = 50  # Cluster members listed per search result; the rest are paged via /item/cluster/{cluster_id}
+
+    link_chunk_size: int = 100_000  # Candidate pairs fetched and scored per server-side cursor batch
+    link_workers: int = 1  # Processes scoring candidate shards in parallel, each on its own connection; 1 scores in-process
+    link_shards_per_worker: int = 4  # Id-range shards per worker, so uneven shards still balance out
+
+    candidate_mode: str = "exact"  # "exact" runs the price-band self-join, "ann" takes top-K neighbours from the HNSW index
+    ann_top_k: int = 50  # Neighbours fetched per item in ann mode
+    ann_ef_search: int = 100  # hnsw.ef_search during candidate generation, must be >= ann_top_k
+    ann_recall_sample: int = 200  # Items sampled to measure ann recall against the exact join, 0 disables
+
 
     t1_mapping: dict = {
         "codigo": "business_id",
@@ -52,5 +106,65 @@ class AppSettings(BaseSettings):
         AND 1 - (a.name_description_embedding <=> b.name_description_embedding) >= 0.7
     """
 
-client = OpenAI()
+    # Same pairs as similarity_query, but b only ranges over the top-K cosine
+    # neighbours of a. The price band keeps the lower id on the left like the self-join.
+    ann_similarity_query: str = """
+    SELECT DISTINCT
+        LEAST(a.id, n.id) AS item_1_id,
+        GREATEST(a.id, n.id) AS item_2_id,
+        similarity(a.name, n.name) AS sim_name,
+        similarity(a.description, n.description) AS sim_desc
+    FROM raw_item a
+    CROSS JOIN LATERAL (
+        SELECT b.id, b.name, b.description, b.price, b.name_description_embedding
+        FROM raw_item b
+        WHERE b.id <> a.id
+        AND b.id <= :max_item_id
+        ORDER BY b.name_description_embedding <=> a.name_description_embedding
+        LIMIT :ann_top_k
+    ) n
+    WHERE
+        a.id > :source_after
+        AND a.id <= :source_until
+        AND a.name IS NOT NULL
+        AND n.name IS NOT NULL
+        AND CASE WHEN a.id < n.id
+            THEN a.price BETWEEN n.price * 0.7 AND n.price * 1.3
+            ELSE n.price BETWEEN a.price * 0.7 AND a.price * 1.3
+        END
+        AND 1 - (a.name_description_embedding <=> n.name_description_embedding) >= 0.7
+    """
+
+    # Exhaustive pairs touching a sample of items, used as ground truth for ann recall
+    exact_sample_query: str = """
+    SELECT
+        LEAST(s.id, o.id) AS item_1_id,
+        GREATEST(s.id, o.id) AS item_2_id,
+        similarity(s.name, o.name) AS sim_name,
+        similarity(s.description, o.description) AS sim_desc
+    FROM raw_item s
+    JOIN raw_item o
+    ON o.id <> s.id
+    AND o.id <= :max_item_id
+    WHERE
+        s.id = ANY(:sample_ids)
+        AND s.name IS NOT NULL
+        AND o.name IS NOT NULL
+        AND CASE WHEN s.id < o.id
+            THEN s.price BETWEEN o.price * 0.7 AND o.price * 1.3
+            ELSE o.price BETWEEN s.price * 0.7 AND s.price * 1.3
+        END
+        AND 1 - (s.name_description_embedding <=> o.name_description_embedding) >= 0.7
+    """
+
+    @property
+    def embedding_sql_type(self) -> str:
+        """SQL type of name_description_embedding, e.g. vector(1536) or halfvec(512)."""
+        return f"{self.embedding_storage}({self.embedding_dimensions})"
+
+    @property
+    def embedding_cosine_ops(self) -> str:
+        return f"{self.embedding_storage}_cosine_ops"
+
+
 settings = AppSettings()
@@ -0,0 +1,222 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at /metrics.
+
+Each metric keeps its samples in plain dicts behind a lock, so recording costs
+a perf_counter call and a dict update. Timing log lines are emitted on the
+"timing" logger as JSON when settings.timing_logs is on.
+"""
+import bisect
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from core.config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+timing_logger = logging.getLogger("timing")
+# Timing lines go to stderr on their own, whatever the server's logging config
+timing_logger.setLevel(logging.INFO)
+timing_logger.propagate = False
+timing_logger.addHandler(logging.StreamHandler())
+
+
+def log_timing(event: str, **fields):
+    """One structured timing line, only when settings.timing_logs is on."""
+    if settings.timing_logs:
+        timing_logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels):
+        """For counters, mirror a cumulative count kept elsewhere, from a collector."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return super().render() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+        lines = super().render()
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics plus collectors, callables that refresh gauges right before rendering."""
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+
+INGEST_STAGE_SECONDS = registry.histogram(
+    "ingest_stage_duration_seconds",
+    "Ingest time per stage: parse (CSV reading and mapping), embed, encode per batch; copy per upload",
+    ("stage",),
+)
+INGEST_ROWS = registry.counter("ingest_rows_total", "Rows ingested")
+INGEST_ROWS_PER_SECOND = registry.gauge("ingest_rows_per_second", "Throughput of the last ingest")
+
+EMBEDDING_REQUEST_SECONDS = registry.histogram(
+    "embedding_request_duration_seconds", "Embedding provider latency per call", ("provider",)
+)
+EMBEDDING_TEXTS = registry.counter("embedding_texts_total", "Texts sent to the embedding provider", ("provider",))
+EMBEDDING_RETRIES = registry.counter("embedding_retries_total", "Retried embedding API requests")
+
+EMBEDDING_CACHE_LOOKUPS = registry.counter(
+    "embedding_cache_lookups_total", "Embedding cache lookups since start by result", ("result",)
+)
+EMBEDDING_CACHE_ENTRIES = registry.gauge("embedding_cache_entries", "Embeddings held in the in-process LRU")
+
+SEARCH_STAGE_SECONDS = registry.histogram(
+    "search_stage_duration_seconds", "Search time per stage: embed, knn, clusters", ("kind", "stage")
+)
+
+LINK_STAGE_SECONDS = registry.histogram(
+    "link_stage_duration_seconds", "Link job time per stage", ("stage",)
+)
+LINK_JOBS = registry.counter("link_jobs_total", "Finished link jobs", ("status",))
+LINK_CANDIDATE_PAIRS = registry.gauge("link_candidate_pairs", "Candidate pairs fetched by the last link run")
+LINK_EDGES = registry.gauge("link_edges", "Linking edges of the last link run")
+LINK_CLUSTERS = registry.gauge("link_clusters", "Clusters of the last link run")
+LINK_ITEMS = registry.gauge("link_items", "Items covered by the last link run")
@@ -0,0 +1,47 @@
+"""
+Build the item_cluster centroid partition of the active cluster run, for runs
+linked before cluster_centroids existed or with it off. Later link runs build
+their own. Run with --dry-run to report the run only.
+"""
+import argparse
+
+from sqlmodel import text
+
+from core.database import create_db_and_tables, engine
+from services.cluster_centroids import attach_centroid_partition, build_centroids, create_centroid_partition
+from services.link_job import get_active_run
+from services.snapshot import centroid_partition, run_chain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    # Creates the partitioned item_cluster parent on existing databases
+    create_db_and_tables()
+
+    with engine.begin() as conn:
+        run = get_active_run(conn)
+        if run is None:
+            print("No active cluster run.")
+            return
+        run_id = run["cluster_run_id"]
+        partition = centroid_partition(run_id)
+        if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition}).scalar_one():
+            print(f"{partition} already exists.")
+            return
+
+        print(f"build {partition}")
+        if args.dry_run:
+            return
+
+        create_centroid_partition(conn, run_id)
+        clusters = build_centroids(conn, run_id, run_chain(conn, run_id))
+        attach_centroid_partition(conn, run_id)
+
+    print(f"{clusters} cluster centroids built for run {run_id}.")
+
+
+if __name__ == "__main__":
+    main()
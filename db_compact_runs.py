@@ -0,0 +1,50 @@
+"""
+Prune old cluster runs and compact delta chains.
+
+Keeps the active run and the newest --keep runs. Kept delta runs whose chain
+reaches a pruned run are rewritten as full snapshots first, so every kept run
+still resolves to the same view. --compact also rewrites every kept delta run
+in full. Run with --dry-run to print the plan only.
+"""
+import argparse
+
+from sqlmodel import text
+
+from core.database import engine
+from services.snapshot import compact_run, delete_runs, plan_retention
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keep", type=int, default=5, help="Newest runs to keep besides the active one")
+    parser.add_argument("--compact", action="store_true", help="Rewrite every kept delta run as a full snapshot")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        to_compact, to_delete = plan_retention(conn, args.keep)
+
+        if args.compact:
+            deltas = conn.execute(
+                text("SELECT cluster_run_id FROM cluster_run WHERE storage = 'delta' ORDER BY created_at, id")
+            ).scalars().all()
+            to_compact = [run_id for run_id in deltas if run_id not in to_delete]
+
+        for run_id in to_compact:
+            print(f"compact {run_id}")
+        for run_id in to_delete:
+            print(f"delete  {run_id}")
+
+        if args.dry_run:
+            conn.rollback()
+            return
+
+        for run_id in to_compact:
+            compact_run(conn, run_id)
+        delete_runs(conn, to_delete)
+
+    print(f"Compacted {len(to_compact)} runs, deleted {len(to_delete)} runs.")
+
+
+if __name__ == "__main__":
+    main()
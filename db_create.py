@@ -1,8 +1,10 @@
 from uuid import UUID
 from sqlmodel import Session
+from core.config import settings
 from core.database import create_db_and_tables, engine
 from models.item import RawItem
 from models.item_cluster_snapshot import ItemClusterSnapshot
+from services.snapshot import attach_snapshot_partition, create_snapshot_partition
 
 
 def insert_initial_data():
@@ -17,14 +19,18 @@ def insert_initial_data():
             unit_type="Sample Unit",
             price=19.99,
             stock=100,
-            name_description_embedding=[0.0]*1536  # Example embedding vector
+            name_description_embedding=[0.0] * settings.embedding_dimensions  # Example embedding vector
         )
         session.add(raw_item)
         session.flush()
         
+        run_id = UUID("123e4567-e89b-12d3-a456-426614174000")
+        create_snapshot_partition(session.connection(), run_id)
+        attach_snapshot_partition(session.connection(), run_id)
+
         item_snapshot = ItemClusterSnapshot(
             created_by="system",
-            cluster_run_id=UUID("123e4567-e89b-12d3-a456-426614174000"),
+            cluster_run_id=run_id,
             cluster_id=1,
             raw_item_id=raw_item.id
         )
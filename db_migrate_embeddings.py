@@ -0,0 +1,112 @@
+"""
+Convert raw_item.name_description_embedding and item_cluster.centroid to the
+layout configured by EMBEDDING_STORAGE / EMBEDDING_DIMENSIONS (e.g.
+halfvec(512)).
+
+Reduced dimensions keep the leading components and re-normalise them, which is
+how text-embedding-3 models shorten embeddings. The HNSW indexes are rebuilt
+for the new type. A centroid is a mean of member embeddings, so it cannot be
+truncated the same way: every run's centroid partition is dropped and rebuilt
+from the converted embeddings, as db_build_centroids.py does. Run with
+--dry-run to print the statements and the partitions to rebuild only.
+"""
+import argparse
+
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import text
+
+from core.config import settings
+from core.database import engine
+from models.item import RawItem
+from models.item_cluster import ItemCluster
+from services.cluster_centroids import attach_centroid_partition, build_centroids, create_centroid_partition
+from services.snapshot import centroid_partition, run_chain
+
+INDEX_NAME = "ix_raw_item_name_description_embedding_hnsw"
+CENTROID_INDEX_NAME = "ix_item_cluster_centroid_hnsw"
+
+
+def convert_column(table: str, column: str) -> str:
+    target = settings.embedding_sql_type
+    return f"""
+        ALTER TABLE {table}
+        ALTER COLUMN {column} TYPE {target}
+        USING l2_normalize(
+            subvector({column}, 1, {settings.embedding_dimensions})
+        )::{target}
+        """
+
+
+def migration_statements() -> list[str]:
+    index = next(i for i in RawItem.__table__.indexes if i.name == INDEX_NAME)
+    return [
+        f"DROP INDEX IF EXISTS {INDEX_NAME}",
+        convert_column("raw_item", "name_description_embedding"),
+        str(CreateIndex(index).compile(engine)),
+    ]
+
+
+def centroid_statements() -> list[str]:
+    """Retype the emptied item_cluster parent; each attached partition then builds its own index."""
+    index = next(i for i in ItemCluster.__table__.indexes if i.name == CENTROID_INDEX_NAME)
+    return [
+        f"DROP INDEX IF EXISTS {CENTROID_INDEX_NAME}",
+        convert_column("item_cluster", "centroid"),
+        str(CreateIndex(index).compile(engine)),
+    ]
+
+
+def centroid_runs(conn) -> list:
+    """Runs that have a centroid partition."""
+    run_ids = conn.execute(text("SELECT cluster_run_id FROM cluster_run ORDER BY created_at, id")).scalars().all()
+    return [
+        run_id
+        for run_id in run_ids
+        if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": centroid_partition(run_id)}).scalar_one()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        # Databases linked before cluster_centroids existed have no item_cluster
+        has_centroids = conn.execute(text("SELECT to_regclass('item_cluster') IS NOT NULL")).scalar_one()
+        runs = centroid_runs(conn) if has_centroids else []
+
+        if args.dry_run:
+            for statement in migration_statements():
+                print(statement.strip() + ";")
+            for run_id in runs:
+                print(f"DROP TABLE {centroid_partition(run_id)};")
+            if has_centroids:
+                for statement in centroid_statements():
+                    print(statement.strip() + ";")
+            for run_id in runs:
+                print(f"-- rebuild {centroid_partition(run_id)}")
+            conn.rollback()
+            return
+
+        for statement in migration_statements():
+            conn.execute(text(statement))
+
+        if has_centroids:
+            for run_id in runs:
+                conn.execute(text(f"DROP TABLE {centroid_partition(run_id)}"))
+            for statement in centroid_statements():
+                conn.execute(text(statement))
+            for run_id in runs:
+                create_centroid_partition(conn, run_id)
+                build_centroids(conn, run_id, run_chain(conn, run_id))
+                attach_centroid_partition(conn, run_id)
+
+    print(
+        f"name_description_embedding migrated to {settings.embedding_sql_type}, "
+        f"{len(runs)} centroid partitions rebuilt."
+    )
+
+
+if __name__ == "__main__":
+    main()
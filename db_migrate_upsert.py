@@ -0,0 +1,95 @@
+"""
+Add the columns and indexes used by upsert ingest to an existing raw_item:
+supplier, content_hash, updated_at/updated_by, relink_pending, changed_seq,
+the partial unique index on (supplier, business_id), the relink_pending and
+changed_seq indexes and the raw_item_changes_seq sequence.
+
+Rows ingested before have no supplier, so upserts never match them and the
+first upsert of an already loaded file would insert its rows a second time.
+--supplier KEY assigns them the key their supplier's uploads will use (the
+supplier parameter of POST /item/csv, else "t1" or "t2"). Their content_hash
+stays NULL, so that first upsert updates every row once, taking unchanged
+texts' embeddings from embedding_cache. Before the unique index is created,
+the migration stops if (supplier, business_id) is not unique. Run with
+--dry-run to print the statements only.
+"""
+import argparse
+
+from sqlalchemy.schema import CreateIndex, CreateSequence
+from sqlmodel import text
+
+from core.database import engine
+from models.item import RAW_ITEM_CHANGES_SEQ, RawItem
+
+COLUMNS = {
+    "supplier": "VARCHAR",
+    "content_hash": "VARCHAR",
+    "updated_at": "TIMESTAMP WITH TIME ZONE",
+    "updated_by": "VARCHAR",
+    "relink_pending": "BOOLEAN NOT NULL DEFAULT false",
+    "changed_seq": "BIGINT",
+}
+INDEX_NAMES = ("ux_raw_item_supplier_business_id", "ix_raw_item_relink_pending", "ix_raw_item_changed_seq")
+
+
+# Reported before the unique index would fail on them
+DUPLICATES_SQL = """
+    SELECT supplier, business_id, COUNT(*) AS rows
+    FROM raw_item
+    WHERE supplier IS NOT NULL
+    GROUP BY supplier, business_id
+    HAVING COUNT(*) > 1
+    ORDER BY COUNT(*) DESC, supplier, business_id
+    LIMIT :limit
+"""
+DUPLICATES_REPORTED = 20
+
+
+def column_statements() -> list[str]:
+    return [f"ALTER TABLE raw_item ADD COLUMN IF NOT EXISTS {name} {sql_type}" for name, sql_type in COLUMNS.items()]
+
+
+def backfill_statement(supplier: str) -> str:
+    quoted = supplier.replace("'", "''")
+    return f"UPDATE raw_item SET supplier = '{quoted}' WHERE supplier IS NULL"
+
+
+def index_statements() -> list[str]:
+    indexes = [index for index in RawItem.__table__.indexes if index.name in INDEX_NAMES]
+    return [
+        *(str(CreateIndex(index, if_not_exists=True).compile(engine)) for index in indexes),
+        str(CreateSequence(RAW_ITEM_CHANGES_SEQ, if_not_exists=True).compile(engine)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--supplier", help="Supplier key assigned to rows without one")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    backfill = [backfill_statement(args.supplier)] if args.supplier else []
+    if args.dry_run:
+        for statement in [*column_statements(), *backfill, *index_statements()]:
+            print(statement.strip() + ";")
+        return
+
+    with engine.begin() as conn:
+        for statement in [*column_statements(), *backfill]:
+            conn.execute(text(statement))
+
+        duplicates = conn.execute(text(DUPLICATES_SQL), {"limit": DUPLICATES_REPORTED}).fetchall()
+        if duplicates:
+            # Leaving the block rolls every statement back
+            lines = "\n".join(f"  {row.supplier} {row.business_id}: {row.rows} rows" for row in duplicates)
+            raise SystemExit(
+                "raw_item has several rows per (supplier, business_id), delete or re-key them and run again:\n" + lines
+            )
+
+        for statement in index_statements():
+            conn.execute(text(statement))
+    print("raw_item migrated for upsert ingest.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Convert item_cluster_snapshot into a table list-partitioned by cluster_run_id,
+moving each existing run into its own partition.
+
+The old table, its indexes and id sequence are renamed out of the way, the
+partitioned table is created from the model and the old table is dropped once
+every run has been copied. Run with --dry-run to print the statements only.
+"""
+import argparse
+
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import text
+
+from core.database import engine
+from models.item import RawItem  # noqa: F401  (foreign key target)
+from models.item_cluster_snapshot import ItemClusterSnapshot
+from services.snapshot import snapshot_partition
+
+TABLE = ItemClusterSnapshot.__tablename__
+OLD_TABLE = f"{TABLE}_unpartitioned"
+COLUMNS = "created_at, created_by, cluster_run_id, cluster_id, raw_item_id"
+
+
+def migration_statements(run_ids: list) -> list[str]:
+    table = ItemClusterSnapshot.__table__
+    statements = [
+        f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}",
+        f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {OLD_TABLE}_pkey",
+        f"ALTER SEQUENCE {TABLE}_id_seq RENAME TO {OLD_TABLE}_id_seq",
+        *(
+            f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_unpartitioned"
+            for index in table.indexes
+        ),
+        str(CreateTable(table).compile(engine)),
+        *(str(CreateIndex(index).compile(engine)) for index in table.indexes),
+    ]
+    for run_id in run_ids:
+        partition = snapshot_partition(run_id)
+        statements += [
+            f"CREATE TABLE {partition} (LIKE {TABLE} INCLUDING DEFAULTS)",
+            f"""
+            INSERT INTO {partition} ({COLUMNS})
+            SELECT {COLUMNS} FROM {OLD_TABLE}
+            WHERE cluster_run_id = '{run_id}'
+            """,
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {partition} FOR VALUES IN ('{run_id}')",
+        ]
+    statements.append(f"DROP TABLE {OLD_TABLE}")
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        run_ids = conn.execute(text(f"SELECT DISTINCT cluster_run_id FROM {TABLE}")).scalars().all()
+        statements = migration_statements(run_ids)
+
+        if args.dry_run:
+            for statement in statements:
+                print(statement.strip() + ";")
+            return
+
+        for statement in statements:
+            conn.execute(text(statement))
+
+    print(f"{TABLE} partitioned by cluster_run_id, {len(run_ids)} runs moved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
-from endpoints.routers import item
+from endpoints.routers import embedding, item, metrics
 
 api_router = APIRouter()
 
 api_router.include_router(item.router, tags=["item"], prefix="/item")
+api_router.include_router(embedding.router, tags=["embedding"], prefix="/embedding")
+api_router.include_router(metrics.router, tags=["metrics"])
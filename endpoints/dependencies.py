@@ -1,13 +1,22 @@
-from typing import Annotated, Generator
+from typing import Annotated, AsyncGenerator, Generator
 
-from core.database import engine
+from core.database import async_engine, engine
 from fastapi import Depends
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
-def get_db() -> Generator:
+async def get_db() -> AsyncGenerator:
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+def get_sync_db() -> Generator:
     with Session(engine) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
+
+# For handlers that run in the threadpool and need psycopg2 features such as COPY
+SyncSessionDep = Annotated[Session, Depends(get_sync_db)]
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from services.embedding import embedding_cache
+from models.base import BaseResponseOut
+
+router = APIRouter()
+
+
+@router.get("/cache", response_model=BaseResponseOut)
+async def embedding_cache_stats_api():
+    """
+    Hit, miss and eviction counters of the embedding cache.
+    """
+    return BaseResponseOut(message="Embedding cache stats", result=embedding_cache.stats())
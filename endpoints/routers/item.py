@@ -1,44 +1,163 @@
-from fastapi import APIRouter, Query
+import asyncio
+import uuid
+from decimal import Decimal
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter, HTTPException, Query
 from fastapi import UploadFile, File
-from services.item import ingest_items_csv, search_items_with_clusters
-from services.link_job import link_job
+from services.item import (
+    get_cluster_members,
+    ingest_items_csv,
+    search_items_batch_with_clusters,
+    search_items_with_clusters,
+)
+from services.link_runner import link_runner
 from models.base import BaseResponseOut
-from schemas.item import SearchItemsResponse
+from schemas.item import (
+    BatchSearchRequest,
+    BatchSearchResponse,
+    ClusterMembersPage,
+    CompactBatchSearchResponse,
+    CompactSearchResponse,
+    IngestSummary,
+    SearchFilters,
+    SearchItemsResponse,
+)
+from schemas.link_job import LinkJobStatus
 
-from endpoints.dependencies import SessionDep
+from endpoints.dependencies import SessionDep, SyncSessionDep
 
 router = APIRouter()
 
 
-@router.post("/csv", response_model=BaseResponseOut)
-async def ingest_items_csv_api(
-    db: SessionDep, file: UploadFile = File(...),
-) -> None:
+@router.post("/csv", response_model=BaseResponseOut[IngestSummary])
+def ingest_items_csv_api(
+    db: SyncSessionDep,
+    file: UploadFile = File(...),
+    mode: Optional[Literal["append", "upsert"]] = Query(None, description="Ingest mode, defaults to settings.ingest_mode"),
+    supplier: Optional[str] = Query(
+        None,
+        min_length=1,
+        description="Supplier key of upserted rows, defaults to the CSV format (t1/t2)",
+    ),
+):
     """
     Ingest items from uploaded CSV file.
+
+    Declared sync so FastAPI runs it in the threadpool, keeping the event loop free.
     """
-    ingest_items_csv(
+    summary = ingest_items_csv(
         db=db,
-        file=file
+        file=file,
+        mode=mode,
+        supplier=supplier,
     )
-    return BaseResponseOut(message="Items ingested successfully")
+    return BaseResponseOut(message="Items ingested successfully", result=summary)
 
 
-@router.post("/link", response_model=BaseResponseOut)
+@router.post("/link", response_model=BaseResponseOut[LinkJobStatus], status_code=202)
 async def link_items_api(
-) -> None:
+    mode: Optional[Literal["full", "incremental"]] = Query(None, description="Link mode, defaults to settings.link_mode"),
+    candidate_mode: Optional[Literal["exact", "ann"]] = Query(None, description="Candidate generation, defaults to settings.candidate_mode"),
+):
+    """
+    Queue a link run. Poll GET /item/link/{job_id} for progress.
+    """
+    job = await asyncio.to_thread(link_runner.submit, mode, candidate_mode)
+    return BaseResponseOut(message="Link job queued", result=job)
+
+
+@router.get("/link", response_model=BaseResponseOut[List[LinkJobStatus]])
+async def list_link_jobs_api():
+    """
+    Recent link jobs, newest first.
     """
-    Link items based on their relationships.
+    return BaseResponseOut(message="Link jobs", result=await asyncio.to_thread(link_runner.list))
+
+
+@router.get("/link/{job_id}", response_model=BaseResponseOut[LinkJobStatus])
+async def get_link_job_api(job_id: uuid.UUID):
+    """
+    Status, per-stage progress and timings of a link job.
+    """
+    job = await asyncio.to_thread(link_runner.get, job_id)
+    if job is None:
+        raise HTTPException(404, "Link job not found")
+    return BaseResponseOut(message="Link job status", result=job)
+
+
+@router.delete("/link/{job_id}", response_model=BaseResponseOut[LinkJobStatus])
+async def cancel_link_job_api(job_id: uuid.UUID):
     """
-    link_job()
-    return BaseResponseOut(message="Items linked successfully")
+    Cancel a queued or running link job. A running job stops before its next stage.
+    """
+    job = await asyncio.to_thread(link_runner.cancel, job_id)
+    if job is None:
+        raise HTTPException(404, "Link job not found")
+    return BaseResponseOut(message="Link job cancellation requested", result=job)
 
 
-@router.get("/search", response_model = SearchItemsResponse)
+@router.get("/search", response_model=Union[SearchItemsResponse, CompactSearchResponse])
 async def search_items_api(
     db: SessionDep,
     q: str = Query(..., description="Search query"),
-    top_k: int = Query(10, ge=1, le=100)
+    top_k: int = Query(10, ge=1, le=100),
+    mode: Optional[Literal["vector", "hybrid", "cluster"]] = Query(None, description="Search mode, defaults to settings.search_mode"),
+    price_min: Optional[Decimal] = Query(None, ge=0),
+    price_max: Optional[Decimal] = Query(None, ge=0),
+    category: Optional[str] = Query(None, description="Exact category"),
+    brand_name: Optional[str] = Query(None, description="Exact brand name"),
+    format: Literal["full", "compact"] = Query("full", description="compact lists every item once in a shared items table"),
+    max_associated_items: Optional[int] = Query(None, ge=0, le=1000, description="Members listed per cluster, defaults to settings.search_max_associated_items"),
 ):
-    results = search_items_with_clusters(db=db, query=q, top_k=top_k)
-    return SearchItemsResponse(results=results)
\ No newline at end of file
+    body = await search_items_with_clusters(
+        db=db,
+        query=q,
+        top_k=top_k,
+        response_format=format,
+        max_associated_items=max_associated_items,
+        mode=mode,
+        filters=SearchFilters(
+            price_min=price_min, price_max=price_max, category=category, brand_name=brand_name
+        ).model_dump(exclude_none=True),
+    )
+    if format == "compact":
+        return CompactSearchResponse(**body)
+    return SearchItemsResponse(**body)
+
+
+@router.post("/search/batch", response_model=Union[BatchSearchResponse, CompactBatchSearchResponse])
+async def search_items_batch_api(
+    db: SessionDep,
+    body: BatchSearchRequest,
+):
+    """
+    Run many searches in one request; results follow the order of body.queries.
+    """
+    results = await search_items_batch_with_clusters(
+        db=db,
+        queries=body.queries,
+        top_k=body.top_k,
+        response_format=body.format,
+        max_associated_items=body.max_associated_items,
+        mode=body.mode,
+        filters=body.filters.model_dump(exclude_none=True) if body.filters else None,
+    )
+    if body.format == "compact":
+        return CompactBatchSearchResponse(**results)
+    return BatchSearchResponse(**results)
+
+
+@router.get("/cluster/{cluster_id}", response_model=BaseResponseOut[ClusterMembersPage])
+async def get_cluster_members_api(
+    db: SessionDep,
+    cluster_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Members of a cluster in the active run, ordered by item id, one page at a time.
+    """
+    page = await get_cluster_members(db=db, cluster_id=cluster_id, offset=offset, limit=limit)
+    if page is None:
+        raise HTTPException(404, "Cluster not found")
+    return BaseResponseOut(message="Cluster members", result=page)
@@ -1,9 +1,48 @@
+import time
+from contextlib import asynccontextmanager
+from core.metrics import HTTP_REQUEST_SECONDS, log_timing
 from endpoints.api import api_router
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from services.link_runner import link_runner
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    link_runner.start()
+    yield
+    link_runner.shutdown()
+
 
 app = FastAPI(
     title="Linking Service",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    # Requests that raise are recorded as the 500 the server answers with
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        seconds = time.perf_counter() - start
+
+        # Route templates keep label cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(seconds, method=request.method, route=route_path, status=status)
+        log_timing(
+            "request",
+            method=request.method,
+            route=route_path,
+            status=status,
+            ms=round(seconds * 1000, 3),
+        )
+
+
 app.include_router(api_router)
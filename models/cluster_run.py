@@ -0,0 +1,50 @@
+import uuid
+from typing import Optional
+from sqlalchemy import Index, text
+from sqlmodel import SQLModel, Field
+
+from .base import BaseCreated, BaseTable
+
+
+class ClusterRunBase(SQLModel):
+    cluster_run_id: uuid.UUID = Field(index=True, unique=True)
+
+    mode: str = Field(default="full")
+
+    # Highest raw_item.id covered by this run; incremental runs only score items above it
+    max_item_id: int = Field(default=0)
+
+    # Points search at this run; at most one run is active
+    is_active: bool = Field(default=False)
+
+    item_count: int = Field(default=0)
+    cluster_count: int = Field(default=0)
+
+    # "full" stores every item, "delta" only items whose cluster differs from base_run_id's view
+    storage: str = Field(default="full")
+    base_run_id: Optional[uuid.UUID] = Field(default=None)
+    snapshot_rows: int = Field(default=0)
+
+    candidate_mode: str = Field(default="exact")
+    candidate_pairs: int = Field(default=0)
+    # Candidate pairs accepted by the link model
+    edge_count: int = Field(default=0)
+    # Share of the exhaustive join's linking pairs found by ann candidate generation, measured on a sample
+    candidate_recall: Optional[float] = Field(default=None)
+
+
+class ClusterRun(
+    ClusterRunBase,
+    BaseCreated,
+    BaseTable,
+    table=True
+):
+    __tablename__ = "cluster_run"
+    __table_args__ = (
+        Index(
+            "ux_cluster_run_active",
+            "is_active",
+            unique=True,
+            postgresql_where=text("is_active"),
+        ),
+    )
@@ -0,0 +1,22 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column
+from pgvector.sqlalchemy import Vector
+
+from .base import BaseTable
+
+
+class EmbeddingCacheBase(SQLModel):
+    # sha256 of model and input text
+    content_hash: str = Field(index=True, unique=True)
+
+    model: str
+
+    embedding: list[float] = Field(sa_column=Column(Vector(), nullable=False))
+
+
+class EmbeddingCache(
+    EmbeddingCacheBase,
+    BaseTable,
+    table=True
+):
+    __tablename__ = "embedding_cache"
@@ -1,15 +1,33 @@
 from typing import List, Optional, TYPE_CHECKING
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Column, Numeric
+from sqlalchemy import BigInteger, Column, Index, Numeric, Sequence, text
 from decimal import Decimal
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 
-from .base import BaseCreated, BaseTable
+from core.config import settings
+
+from .base import BaseCreated, BaseTable, BaseUpdated
 
 if TYPE_CHECKING:
     from .item_cluster_snapshot import ItemClusterSnapshot
 
 
+EMBEDDING_STORAGES = ("vector", "halfvec")
+
+# Hands every upsert the changed_seq it stamps on the rows it updates; in-memory
+# copies of item payloads reload the rows above the value they last read
+RAW_ITEM_CHANGES_SEQ = Sequence("raw_item_changes_seq", metadata=SQLModel.metadata)
+
+
+def embedding_column_type():
+    """Column type for name_description_embedding from settings.embedding_storage."""
+    if settings.embedding_storage not in EMBEDDING_STORAGES:
+        raise ValueError(f"Unknown embedding storage: {settings.embedding_storage}")
+    if settings.embedding_storage == "halfvec":
+        return HALFVEC(settings.embedding_dimensions)
+    return Vector(settings.embedding_dimensions)
+
+
 class BaseRawItem(SQLModel):
     business_id: str
     name: str
@@ -24,17 +42,61 @@ class BaseRawItem(SQLModel):
 
     name_description_embedding: Optional[list[float]] = Field(
         default=None,
-        sa_column=Column(Vector(1536))
+        sa_column=Column(embedding_column_type())
     )
 
+    # Supplier key the row was upserted under (the CSV format unless given); NULL for append mode
+    supplier: Optional[str] = None
+    # Hash of the mapped CSV fields, so re-uploads skip unchanged rows
+    content_hash: Optional[str] = None
+    # Set by upserts that change the row, cleared by the link run that read the change
+    relink_pending: bool = Field(default=False, sa_column_kwargs={"server_default": text("false")})
+    # raw_item_changes_seq value of the last upsert that updated the row
+    changed_seq: Optional[int] = Field(default=None, sa_type=BigInteger)
+
 
 class RawItem(
     BaseRawItem,
     BaseCreated,
+    BaseUpdated,
     BaseTable,
     table=True
 ):
     __tablename__ = "raw_item"
+    __table_args__ = (
+        Index(
+            "ix_raw_item_name_description_embedding_hnsw",
+            "name_description_embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"name_description_embedding": settings.embedding_cosine_ops},
+        ),
+        # Lexical leg of hybrid search (word_similarity <% operator)
+        Index("ix_raw_item_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index(
+            "ix_raw_item_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+        Index("ix_raw_item_business_id", "business_id"),
+        # Search filters; selective ones are planned as bitmap scans plus an exact top-k sort
+        Index("ix_raw_item_category", "category"),
+        Index("ix_raw_item_brand_name", "brand_name"),
+        Index("ix_raw_item_price", "price"),
+        # Upsert conflict target
+        Index(
+            "ux_raw_item_supplier_business_id",
+            "supplier",
+            "business_id",
+            unique=True,
+            postgresql_where=text("supplier IS NOT NULL"),
+        ),
+        # Incremental link checks for rows changed since the active run
+        Index("ix_raw_item_relink_pending", "id", postgresql_where=text("relink_pending")),
+        # Rows updated since a cluster cache's items version
+        Index("ix_raw_item_changed_seq", "changed_seq", postgresql_where=text("changed_seq IS NOT NULL")),
+    )
 
     cluster_snapshots: List["ItemClusterSnapshot"] = Relationship(
         back_populates="raw_item"
@@ -0,0 +1,53 @@
+import uuid
+from typing import Optional
+from sqlalchemy import Column, Index
+from sqlmodel import SQLModel, Field
+
+from core.config import settings
+
+from .base import BaseCreated, BaseTable
+from .item import embedding_column_type
+
+
+class ItemClusterBase(SQLModel):
+    cluster_run_id: uuid.UUID = Field(index=True)
+
+    cluster_id: int = Field(index=True)
+
+    member_count: int = Field(default=0)
+
+    # Member nearest to the centroid
+    representative_item_id: int = Field(foreign_key="raw_item.id")
+
+    # Mean of the members' embeddings
+    centroid: Optional[list[float]] = Field(
+        default=None,
+        sa_column=Column(embedding_column_type())
+    )
+
+
+class ItemCluster(
+    ItemClusterBase,
+    BaseCreated,
+    BaseTable,
+    table=True
+):
+    __tablename__ = "item_cluster"
+    # One partition per run like item_cluster_snapshot (see services/cluster_centroids.py)
+    __table_args__ = (
+        Index(
+            "ix_item_cluster_centroid_hnsw",
+            "centroid",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"centroid": settings.embedding_cosine_ops},
+        ),
+        {"postgresql_partition_by": "LIST (cluster_run_id)"},
+    )
+
+    id: int | None = Field(
+        default=None,
+        primary_key=True,
+        sa_column_kwargs={"autoincrement": True},
+    )
+    cluster_run_id: uuid.UUID = Field(primary_key=True)
@@ -26,6 +26,15 @@ class ItemClusterSnapshot(
     table=True
 ):
     __tablename__ = "item_cluster_snapshot"
+    # One partition per run (see services/snapshot.py); the partition key must be part of the primary key
+    __table_args__ = {"postgresql_partition_by": "LIST (cluster_run_id)"}
+
+    id: int | None = Field(
+        default=None,
+        primary_key=True,
+        sa_column_kwargs={"autoincrement": True},
+    )
+    cluster_run_id: uuid.UUID = Field(primary_key=True)
 
     raw_item: Optional["RawItem"] = Relationship(
         back_populates="cluster_snapshots"
@@ -0,0 +1,44 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import TIMESTAMP, Column, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import SQLModel, Field
+
+from .base import BaseTable
+
+
+class LinkJobBase(SQLModel):
+    job_id: uuid.UUID = Field(index=True, unique=True)
+
+    # queued, running, cancelling, succeeded, failed or cancelled
+    status: str = Field(default="queued")
+
+    mode: Optional[str] = None
+    candidate_mode: Optional[str] = None
+
+    started_at: Optional[datetime] = Field(default=None, sa_type=TIMESTAMP(timezone=True))
+    finished_at: Optional[datetime] = Field(default=None, sa_type=TIMESTAMP(timezone=True))
+
+    # LinkJobStage dicts in LINK_STAGES order
+    stages: list = Field(default_factory=list, sa_column=Column(JSONB, nullable=False))
+    # LinkRunSummary of a succeeded job
+    run: Optional[dict] = Field(default=None, sa_column=Column(JSONB))
+    error: Optional[str] = None
+
+    # Set by a cancel request on any API worker; the worker running the job polls it
+    cancel_requested: bool = Field(default=False, sa_column_kwargs={"server_default": text("false")})
+    # Touched by the running worker; running jobs that stop being touched are failed
+    heartbeat_at: Optional[datetime] = Field(default=None, sa_type=TIMESTAMP(timezone=True))
+
+
+class LinkJob(
+    LinkJobBase,
+    BaseTable,
+    table=True
+):
+    __tablename__ = "link_job"
+    __table_args__ = (
+        # Runners claim the oldest queued job
+        Index("ix_link_job_queued", "created_at", postgresql_where=text("status = 'queued'")),
+    )
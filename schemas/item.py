@@ -1,7 +1,21 @@
-from typing import Dict, List, Optional
+from decimal import Decimal
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
+class IngestSummary(BaseModel):
+    mode: str
+    rows: int
+    inserted: int
+    updated: int
+    unchanged: int
+    # Earlier rows of a business_id the upserted file repeats; the last one wins
+    superseded: int = 0
+    # Rows without a business_id, and the CSV lines of the first of them
+    rejected: int = 0
+    rejected_lines: List[int] = []
+
+
 class AssociatedItem(BaseModel):
     id: int
     business_id: Optional[str] = None
@@ -25,9 +39,76 @@ class SearchItemResult(BaseModel):
     category: Optional[str] = None
     unit_type: Optional[str] = None
     distance: Optional[float] = None
+    # Reciprocal-rank fusion score, hybrid search only
+    score: Optional[float] = None
     cluster_ids: List[int] = Field(default_factory=list)
     associated_items: Dict[int, List[AssociatedItem]] = Field(default_factory=dict)
+    # Full member count per cluster; associated_items is capped at max_associated_items
+    cluster_sizes: Dict[int, int] = Field(default_factory=dict)
 
 
 class SearchItemsResponse(BaseModel):
     results: List[SearchItemResult]
+
+
+class CompactSearchHit(BaseModel):
+    id: int
+    distance: Optional[float] = None
+    score: Optional[float] = None
+    cluster_id: Optional[int] = None
+
+
+class CompactCluster(BaseModel):
+    size: int
+    # First max_associated_items members by id, the hits themselves included
+    member_ids: List[int]
+
+
+class CompactSearchResponse(BaseModel):
+    results: List[CompactSearchHit]
+    clusters: Dict[int, CompactCluster] = Field(default_factory=dict)
+    items: Dict[int, AssociatedItem] = Field(default_factory=dict)
+
+
+class SearchFilters(BaseModel):
+    price_min: Optional[Decimal] = Field(None, ge=0)
+    price_max: Optional[Decimal] = Field(None, ge=0)
+    category: Optional[str] = None
+    brand_name: Optional[str] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=500)
+    top_k: int = Field(10, ge=1, le=100)
+    mode: Optional[Literal["vector", "hybrid", "cluster"]] = None
+    filters: Optional[SearchFilters] = None
+    format: Literal["full", "compact"] = "full"
+    max_associated_items: Optional[int] = Field(None, ge=0, le=1000)
+
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: List[SearchItemResult]
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchResult]
+
+
+class CompactBatchSearchResult(BaseModel):
+    query: str
+    results: List[CompactSearchHit]
+
+
+class CompactBatchSearchResponse(BaseModel):
+    results: List[CompactBatchSearchResult]
+    clusters: Dict[int, CompactCluster] = Field(default_factory=dict)
+    items: Dict[int, AssociatedItem] = Field(default_factory=dict)
+
+
+class ClusterMembersPage(BaseModel):
+    cluster_id: int
+    size: int
+    offset: int
+    limit: int
+    items: List[AssociatedItem]
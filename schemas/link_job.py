@@ -0,0 +1,38 @@
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class LinkJobStage(BaseModel):
+    name: str
+    status: str = "pending"
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    seconds: Optional[float] = None
+
+
+class LinkRunSummary(BaseModel):
+    cluster_run_id: uuid.UUID
+    mode: str
+    candidate_mode: str
+    candidate_pairs: int
+    candidate_recall: Optional[float] = None
+    edge_count: int = 0
+    item_count: int = 0
+    cluster_count: int
+    storage: str = "full"
+    snapshot_rows: int = 0
+
+
+class LinkJobStatus(BaseModel):
+    job_id: uuid.UUID
+    status: str = "queued"
+    mode: Optional[str] = None
+    candidate_mode: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stages: List[LinkJobStage] = Field(default_factory=list)
+    run: Optional[LinkRunSummary] = None
+    error: Optional[str] = None
@@ -0,0 +1,247 @@
+import asyncio
+import time
+import uuid
+
+import numpy as np
+from sqlmodel import text
+
+from core.config import settings
+from core.database import async_engine
+from services.snapshot import RESOLVED_SNAPSHOT_CTE, RUN_CHAIN_SQL, centroid_partition
+
+
+# pg advisory lock key: upserts hold it exclusively from taking their
+# raw_item_changes_seq value until they commit, the cache shares it while it
+# reads the sequence and the rows changed since its last version
+ITEM_CHANGES_LOCK_KEY = 726_100_003
+
+ITEM_COLUMNS = """
+    ri.id,
+    ri.business_id,
+    ri.name,
+    ri.brand_name,
+    ri.description,
+    ri.price,
+    ri.stock,
+    ri.category,
+    ri.unit_type
+"""
+
+
+def item_payload(row) -> dict:
+    """AssociatedItem fields of a raw_item row."""
+    return {
+        "id": row.id,
+        "business_id": row.business_id,
+        "name": row.name,
+        "brand_name": row.brand_name,
+        "description": row.description,
+        "price": str(row.price) if row.price is not None else None,
+        "stock": row.stock,
+        "category": row.category,
+        "unit_type": row.unit_type,
+    }
+
+
+class ClusterMembership:
+    """
+    Cluster membership of one run. item -> cluster is kept as two sorted
+    arrays; member payloads are only kept for clusters with more than one item,
+    since a singleton has nothing to associate.
+    """
+
+    def __init__(
+        self,
+        run_id: uuid.UUID,
+        item_ids: np.ndarray,
+        cluster_ids: np.ndarray,
+        members: dict[int, list[dict]],
+        has_centroids: bool = False,
+    ):
+        order = np.argsort(item_ids, kind="stable")
+        self.run_id = run_id
+        self.item_ids = item_ids[order]
+        self.cluster_ids = cluster_ids[order]
+        self.members = members
+        # Whether the run has an item_cluster partition for "cluster" search
+        self.has_centroids = has_centroids
+
+    def cluster_of(self, item_id: int) -> int | None:
+        pos = np.searchsorted(self.item_ids, item_id)
+        if pos < len(self.item_ids) and self.item_ids[pos] == item_id:
+            return int(self.cluster_ids[pos])
+        return None
+
+    def members_of(self, cluster_id: int) -> list[dict]:
+        return self.members.get(cluster_id, [])
+
+    def member_ids_of(self, cluster_id: int) -> list[int]:
+        """Member ids of a cluster; a singleton's cluster id is its item id."""
+        members = self.members.get(cluster_id)
+        return [member["id"] for member in members] if members else [cluster_id]
+
+    def refresh_items(self, rows):
+        """
+        Replace the member payloads of the raw_item rows given. Each changed
+        cluster gets a new list, so readers see either the old or the new one.
+        """
+        for row in rows:
+            cluster_id = self.cluster_of(row.id)
+            members = self.members.get(cluster_id) if cluster_id is not None else None
+            if not members:
+                continue
+            members = list(members)
+            for pos, member in enumerate(members):
+                if member["id"] == row.id:
+                    members[pos] = item_payload(row)
+                    break
+            self.members[cluster_id] = members
+
+
+async def get_active_run_id(conn) -> uuid.UUID | None:
+    row = (
+        await conn.execute(
+            text("SELECT cluster_run_id FROM cluster_run WHERE is_active")
+        )
+    ).first()
+    return row[0] if row else None
+
+
+async def get_items_version(conn) -> int:
+    """Highest raw_item.changed_seq handed out, see RAW_ITEM_CHANGES_SEQ."""
+    # last_value reads 1 both before and after the first nextval
+    return (
+        await conn.execute(text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM raw_item_changes_seq"))
+    ).scalar_one()
+
+
+async def try_lock_item_changes(conn) -> bool:
+    """Share the item changes lock; False while an upsert is between taking its changed_seq and committing."""
+    return (
+        await conn.execute(text("SELECT pg_try_advisory_xact_lock_shared(:key)"), {"key": ITEM_CHANGES_LOCK_KEY})
+    ).scalar_one()
+
+
+async def load_changed_items(conn, since: int) -> list:
+    """raw_item rows changed by upserts after the items version since."""
+    return (
+        await conn.execute(
+            text(f"SELECT {ITEM_COLUMNS} FROM raw_item ri WHERE ri.changed_seq > :since"),
+            {"since": since},
+        )
+    ).fetchall()
+
+
+def build_membership(run_id: uuid.UUID, rows, member_rows, has_centroids: bool) -> ClusterMembership:
+    pairs = np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+    members: dict[int, list[dict]] = {}
+    for row in member_rows:
+        members.setdefault(row.cluster_id, []).append(item_payload(row))
+
+    return ClusterMembership(run_id, pairs[:, 0], pairs[:, 1], members, has_centroids)
+
+
+async def load_membership(conn, run_id: uuid.UUID) -> ClusterMembership:
+    chain = list((await conn.execute(text(RUN_CHAIN_SQL), {"run_id": run_id})).scalars().all())
+
+    rows = (
+        await conn.execute(
+            text(f"{RESOLVED_SNAPSHOT_CTE} SELECT raw_item_id, cluster_id FROM resolved"),
+            {"chain": chain},
+        )
+    ).fetchall()
+
+    member_rows = (
+        await conn.execute(
+            text(
+                f"""
+                {RESOLVED_SNAPSHOT_CTE}
+                SELECT ics.cluster_id, {ITEM_COLUMNS}
+                FROM resolved ics
+                JOIN raw_item ri ON ri.id = ics.raw_item_id
+                WHERE ics.cluster_id IN (
+                    SELECT cluster_id
+                    FROM resolved
+                    GROUP BY cluster_id
+                    HAVING COUNT(*) > 1
+                )
+                ORDER BY ics.cluster_id, ri.id
+                """
+            ),
+            {"chain": chain},
+        )
+    ).fetchall()
+
+    has_centroids = (
+        await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": centroid_partition(run_id)})
+    ).scalar_one()
+
+    # Building the arrays and payload dicts of a large run takes a while, keep it off the event loop
+    return await asyncio.to_thread(build_membership, run_id, rows, member_rows, has_centroids)
+
+
+class ClusterMembershipCache:
+    """
+    In-process cache of the active run's membership. The cluster_run pointer
+    and the raw_item changes sequence are re-checked at most every
+    cluster_cache_ttl_seconds. A new run is loaded in full; otherwise only the
+    member payloads of rows upserted since the cached version are replaced,
+    so they follow upserts in every API worker. invalidate() forces the next
+    check.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._membership: ClusterMembership | None = None
+        # None when the membership was loaded while an upsert was committing
+        self._items_version: int | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    async def get(self) -> ClusterMembership | None:
+        if time.monotonic() - self._checked_at < self.ttl_seconds:
+            return self._membership
+
+        # While another request reloads, keep serving the current membership
+        if self._lock.locked() and self._membership is not None:
+            return self._membership
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.ttl_seconds:
+                return self._membership
+
+            async with async_engine.connect() as conn:
+                await self._refresh(conn)
+
+            self._checked_at = time.monotonic()
+            return self._membership
+
+    async def _refresh(self, conn):
+        # Held until the connection closes; with it, every row at or below the version read is committed
+        locked = await try_lock_item_changes(conn)
+        if not locked and self._membership is not None:
+            # An upsert is committing; check again after the TTL
+            return
+
+        run_id = await get_active_run_id(conn)
+        items_version = await get_items_version(conn) if locked else None
+
+        if run_id is None:
+            self._membership = None
+        elif (
+            self._membership is None
+            or self._membership.run_id != run_id
+            or self._items_version is None
+        ):
+            self._membership = await load_membership(conn, run_id)
+        elif items_version != self._items_version:
+            rows = await load_changed_items(conn, self._items_version)
+            await asyncio.to_thread(self._membership.refresh_items, rows)
+        self._items_version = items_version
+
+
+cluster_cache = ClusterMembershipCache(settings.cluster_cache_ttl_seconds)
@@ -0,0 +1,63 @@
+"""
+Per-run cluster centroids. item_cluster holds one row per cluster of a run,
+covering singletons too: the mean embedding of its members, the member count
+and the member nearest to the mean. It is list-partitioned by cluster_run_id
+like item_cluster_snapshot, and each partition gets its own HNSW index on
+attach, so "cluster" search scans an index that is smaller than raw_item's
+by the average cluster size.
+"""
+import uuid
+
+from sqlmodel import text
+
+from services.snapshot import RESOLVED_SNAPSHOT_CTE, centroid_partition
+
+
+def create_centroid_partition(conn, run_id: uuid.UUID):
+    conn.execute(
+        text(f"CREATE TABLE {centroid_partition(run_id)} (LIKE item_cluster INCLUDING DEFAULTS)")
+    )
+
+
+def attach_centroid_partition(conn, run_id: uuid.UUID):
+    # Builds the partition's HNSW index after the load
+    conn.execute(
+        text(
+            f"""
+            ALTER TABLE item_cluster
+            ATTACH PARTITION {centroid_partition(run_id)}
+            FOR VALUES IN ('{run_id}')
+            """
+        )
+    )
+
+
+def build_centroids(conn, run_id: uuid.UUID, chain: list[uuid.UUID]) -> int:
+    """
+    Fill the run's centroid partition from its resolved snapshot; chain is the
+    run followed by its base runs, whose snapshot rows must be visible to conn.
+    Returns the number of clusters.
+    """
+    result = conn.execute(
+        text(
+            f"""
+            {RESOLVED_SNAPSHOT_CTE},
+            centroids AS (
+                SELECT r.cluster_id, COUNT(*) AS member_count, AVG(ri.name_description_embedding) AS centroid
+                FROM resolved r
+                JOIN raw_item ri ON ri.id = r.raw_item_id
+                GROUP BY r.cluster_id
+            )
+            INSERT INTO {centroid_partition(run_id)}
+                (created_by, cluster_run_id, cluster_id, member_count, representative_item_id, centroid)
+            SELECT DISTINCT ON (c.cluster_id)
+                'system', :run_id, c.cluster_id, c.member_count, r.raw_item_id, c.centroid
+            FROM centroids c
+            JOIN resolved r ON r.cluster_id = c.cluster_id
+            JOIN raw_item ri ON ri.id = r.raw_item_id
+            ORDER BY c.cluster_id, ri.name_description_embedding <=> c.centroid, r.raw_item_id
+            """
+        ),
+        {"chain": chain, "run_id": run_id},
+    )
+    return result.rowcount
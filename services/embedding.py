@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import text
+
+from core.config import settings
+from core.database import engine
+from core.metrics import (
+    EMBEDDING_CACHE_ENTRIES,
+    EMBEDDING_CACHE_LOOKUPS,
+    EMBEDDING_REQUEST_SECONDS,
+    EMBEDDING_TEXTS,
+    registry,
+)
+from models.embedding_cache import EmbeddingCache
+from services.embedding_providers import EmbeddingProvider, get_embedding_provider
+
+
+def content_hash(model: str, text_: str) -> str:
+    """Cache key for an embedding of text_ produced by model."""
+    return hashlib.sha256(f"{model}\x00{text_}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """
+    Two-level embedding cache: an in-process LRU in front of the
+    embedding_cache table. Keys are content hashes, values float32 embeddings.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Return cached embeddings for keys, checking memory first and then Postgres."""
+        found: dict[str, np.ndarray] = {}
+        missing: list[str] = []
+
+        with self._lock:
+            for key in keys:
+                embedding = self._lru.get(key)
+                if embedding is None:
+                    missing.append(key)
+                else:
+                    self._lru.move_to_end(key)
+                    found[key] = embedding
+            self.memory_hits += len(found)
+
+        for start in range(0, len(missing), settings.embedding_cache_lookup_batch):
+            chunk = missing[start:start + settings.embedding_cache_lookup_batch]
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    text(
+                        """
+                        SELECT content_hash, embedding
+                        FROM embedding_cache
+                        WHERE content_hash = ANY(:keys)
+                        """
+                    ),
+                    {"keys": chunk},
+                ).fetchall()
+
+            with self._lock:
+                for row in rows:
+                    embedding = _parse_vector(row.embedding)
+                    found[row.content_hash] = embedding
+                    self._remember(row.content_hash, embedding)
+                self.db_hits += len(rows)
+
+        with self._lock:
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, model: str, entries: dict[str, np.ndarray]):
+        """Store freshly generated embeddings in memory and Postgres."""
+        if not entries:
+            return
+
+        with self._lock:
+            for key, embedding in entries.items():
+                self._remember(key, embedding)
+
+        rows = [
+            {"content_hash": key, "model": model, "embedding": embedding}
+            for key, embedding in entries.items()
+        ]
+        stmt = insert(EmbeddingCache).on_conflict_do_nothing(index_elements=["content_hash"])
+        with engine.begin() as conn:
+            for start in range(0, len(rows), settings.embedding_cache_lookup_batch):
+                conn.execute(stmt, rows[start:start + settings.embedding_cache_lookup_batch])
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.memory_hits + self.db_hits) / lookups if lookups else None,
+            }
+
+
+def _parse_vector(value) -> np.ndarray:
+    # Raw text queries return pgvector values as '[1,2,3]' strings
+    if isinstance(value, str):
+        return np.fromstring(value.strip("[]"), dtype=np.float32, sep=",")
+    return np.asarray(value, dtype=np.float32)
+
+
+embedding_cache = EmbeddingCacheStore(settings.embedding_cache_size)
+
+
+def _record_cache_stats():
+    stats = embedding_cache.stats()
+    EMBEDDING_CACHE_ENTRIES.set(stats["entries"])
+    EMBEDDING_CACHE_LOOKUPS.set(stats["memory_hits"], result="memory_hit")
+    EMBEDDING_CACHE_LOOKUPS.set(stats["db_hits"], result="db_hit")
+    EMBEDDING_CACHE_LOOKUPS.set(stats["misses"], result="miss")
+
+
+registry.add_collector(_record_cache_stats)
+
+
+def _embed(provider: EmbeddingProvider, texts: list[str]) -> np.ndarray:
+    EMBEDDING_TEXTS.inc(len(texts), provider=provider.model_name)
+    with EMBEDDING_REQUEST_SECONDS.time(provider=provider.model_name):
+        return provider.embed(texts)
+
+
+async def _aembed(provider: EmbeddingProvider, texts: list[str]) -> np.ndarray:
+    EMBEDDING_TEXTS.inc(len(texts), provider=provider.model_name)
+    with EMBEDDING_REQUEST_SECONDS.time(provider=provider.model_name):
+        return await provider.aembed(texts)
+
+
+def generate_embeddings_array(texts: list[str]) -> np.ndarray:
+    """Generate a (len(texts), dim) float32 array of embeddings, reusing cached ones."""
+    provider = get_embedding_provider()
+    if not provider.cacheable:
+        return _embed(provider, texts)
+
+    model = provider.model_name
+    keys = [content_hash(model, t) for t in texts]
+
+    cached = embedding_cache.get_many(list(dict.fromkeys(keys)))
+
+    # Embed each distinct uncached text once, even if repeated in the batch
+    pending: dict[str, str] = {}
+    for key, t in zip(keys, texts):
+        if key not in cached and key not in pending:
+            pending[key] = t
+
+    if pending:
+        fresh = dict(zip(pending.keys(), _embed(provider, list(pending.values()))))
+        embedding_cache.put_many(model, fresh)
+        cached.update(fresh)
+
+    if not keys:
+        return np.empty((0, settings.embedding_dimensions), dtype=np.float32)
+    return np.stack([cached[key] for key in keys])
+
+
+async def agenerate_embeddings_array(texts: list[str]) -> np.ndarray:
+    """
+    Async variant of generate_embeddings_array. Cache reads and writes run in
+    worker threads, provider calls are awaited.
+    """
+    provider = get_embedding_provider()
+    if not provider.cacheable:
+        return await _aembed(provider, texts)
+
+    model = provider.model_name
+    keys = [content_hash(model, t) for t in texts]
+
+    cached = await asyncio.to_thread(embedding_cache.get_many, list(dict.fromkeys(keys)))
+
+    pending: dict[str, str] = {}
+    for key, t in zip(keys, texts):
+        if key not in cached and key not in pending:
+            pending[key] = t
+
+    if pending:
+        fresh = dict(zip(pending.keys(), await _aembed(provider, list(pending.values()))))
+        await asyncio.to_thread(embedding_cache.put_many, model, fresh)
+        cached.update(fresh)
+
+    if not keys:
+        return np.empty((0, settings.embedding_dimensions), dtype=np.float32)
+    return np.stack([cached[key] for key in keys])
+
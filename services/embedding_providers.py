@@ -0,0 +1,281 @@
+import asyncio
+import base64
+import logging
+import math
+import random
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import openai
+
+from core.config import settings
+from core.metrics import EMBEDDING_RETRIES
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDERS = ("openai", "local")
+
+
+@lru_cache
+def get_openai_client() -> openai.OpenAI:
+    return openai.OpenAI()
+
+
+@lru_cache
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI()
+
+
+def estimate_tokens(text_: str) -> int:
+    """Cheap upper-bound token estimate used to size request chunks."""
+    return max(1, math.ceil(len(text_) / settings.embedding_chars_per_token))
+
+
+def chunk_texts(texts: list[str]) -> list[tuple[int, int]]:
+    """
+    Split texts into contiguous [start, end) ranges that respect both the
+    per-request input count and token budget.
+    """
+    chunks = []
+    start = 0
+    tokens = 0
+    for i, t in enumerate(texts):
+        cost = estimate_tokens(t)
+        if i > start and (
+            i - start >= settings.embedding_max_batch_size
+            or tokens + cost > settings.embedding_max_batch_tokens
+        ):
+            chunks.append((start, i))
+            start = i
+            tokens = 0
+        tokens += cost
+    if start < len(texts):
+        chunks.append((start, len(texts)))
+    return chunks
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    """Honour Retry-After when the API sends it, else exponential backoff with jitter."""
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), settings.embedding_backoff_max)
+        except ValueError:
+            pass
+    delay = settings.embedding_backoff_base * (2 ** attempt)
+    return min(delay, settings.embedding_backoff_max) * random.uniform(0.5, 1.0)
+
+
+def _decode_embedding(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype="<f4")
+
+
+def _embeddings_request(texts: list[str]) -> dict:
+    # base64 decodes straight into float32 without building Python float lists
+    return {
+        "input": texts,
+        "model": settings.embedding_model,
+        "encoding_format": "base64",
+        "dimensions": settings.embedding_dimensions,
+    }
+
+
+# Sync embedding requests in flight per process. Ingest embeds several batches
+# at once, each of which may be split into chunks; all of them share this bound.
+_request_slots = threading.BoundedSemaphore(max(1, settings.embedding_concurrency))
+
+
+def request_embeddings_chunk(texts: list[str]) -> np.ndarray:
+    """Call the embedding API for one chunk, retrying on 429, 5xx and connection errors."""
+    # Retries are handled here rather than by the client; each chunk backs off on its own
+    api = get_openai_client().with_options(max_retries=0)
+    for attempt in range(settings.embedding_max_retries + 1):
+        try:
+            # Backoff sleeps below hold no slot
+            with _request_slots:
+                response = api.embeddings.create(**_embeddings_request(texts))
+            return np.stack([_decode_embedding(item.embedding) for item in response.data])
+        except Exception as exc:
+            if attempt == settings.embedding_max_retries or not _is_retryable(exc):
+                raise
+            delay = _retry_delay(exc, attempt)
+            EMBEDDING_RETRIES.inc()
+            logger.warning("embedding request failed (%s), retrying in %.1fs", exc, delay)
+            time.sleep(delay)
+
+
+def request_embeddings(texts: list[str]) -> np.ndarray:
+    """
+    Call the embedding API for texts, without caching. Texts are split into
+    token-budgeted chunks sent concurrently, at most embedding_concurrency
+    requests at once across the process; output rows match input order.
+    """
+    chunks = chunk_texts(texts)
+    if len(chunks) <= 1:
+        return request_embeddings_chunk(texts)
+
+    with ThreadPoolExecutor(max_workers=settings.embedding_concurrency) as pool:
+        futures = [
+            pool.submit(request_embeddings_chunk, texts[start:end])
+            for start, end in chunks
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+
+async def arequest_embeddings_chunk(texts: list[str]) -> np.ndarray:
+    """Async variant of request_embeddings_chunk, backing off without blocking the event loop."""
+    api = get_async_openai_client().with_options(max_retries=0)
+    for attempt in range(settings.embedding_max_retries + 1):
+        try:
+            response = await api.embeddings.create(**_embeddings_request(texts))
+            return np.stack([_decode_embedding(item.embedding) for item in response.data])
+        except Exception as exc:
+            if attempt == settings.embedding_max_retries or not _is_retryable(exc):
+                raise
+            delay = _retry_delay(exc, attempt)
+            EMBEDDING_RETRIES.inc()
+            logger.warning("embedding request failed (%s), retrying in %.1fs", exc, delay)
+            await asyncio.sleep(delay)
+
+
+async def arequest_embeddings(texts: list[str]) -> np.ndarray:
+    """Async variant of request_embeddings with the same chunking and concurrency bound."""
+    semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+
+    async def run(start: int, end: int) -> np.ndarray:
+        async with semaphore:
+            return await arequest_embeddings_chunk(texts[start:end])
+
+    results = await asyncio.gather(*(run(start, end) for start, end in chunk_texts(texts)))
+    return np.concatenate(results)
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into a (len(texts), dim) float32 array. model_name identifies
+    the vector space and is part of the embedding cache key.
+    """
+
+    model_name: str
+    # Whether results are worth storing in the embedding cache
+    cacheable: bool = True
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> np.ndarray:
+        ...
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed, texts)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API, chunked and retried as configured in settings."""
+
+    def __init__(self, model: str, dimensions: int):
+        self.model_name = model if dimensions == 1536 else f"{model}:{dimensions}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return request_embeddings(texts)
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        return await arequest_embeddings(texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Offline embeddings: character n-grams of the lowercased, accent-stripped
+    UTF-8 text are feature-hashed with a sign into dim buckets, then L2
+    normalised. Fully vectorised over the whole batch, no network needed.
+    """
+
+    cacheable = False
+
+    # Odd multiplier for the polynomial rolling hash, and a mixer for the sign
+    _PRIME = np.uint64(0x100000001B3)
+    _SIGN_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, dimensions: int, ngram_sizes: tuple[int, ...]):
+        self.dimensions = dimensions
+        self.ngram_sizes = ngram_sizes
+        self.model_name = f"local-hash-{'-'.join(map(str, ngram_sizes))}:{dimensions}"
+
+    @staticmethod
+    def _normalize(text_: str) -> str:
+        text_ = unicodedata.normalize("NFKD", text_.lower())
+        return " " + " ".join(text_.encode("ascii", "ignore").decode().split()) + " "
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        n = len(texts)
+        if n == 0:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+
+        encoded = [self._normalize(t).encode("ascii") for t in texts]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=n)
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        row_of = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        cells = []
+        signs = []
+        with np.errstate(over="ignore"):
+            for size in self.ngram_sizes:
+                if len(data) < size:
+                    continue
+                count = len(data) - size + 1
+                # n-grams that cross into the next text are dropped
+                valid = row_of[:count] == row_of[size - 1:]
+                hashes = np.zeros(count, dtype=np.uint64)
+                for k in range(size):
+                    hashes = hashes * self._PRIME + data[k:k + count]
+                hashes = hashes[valid]
+                buckets = (hashes % np.uint64(self.dimensions)).astype(np.int64)
+                cells.append(row_of[:count][valid] * self.dimensions + buckets)
+                signs.append(1.0 - 2.0 * ((hashes * self._SIGN_MIX) >> np.uint64(63)).astype(np.float32))
+
+        out = np.bincount(
+            np.concatenate(cells) if cells else np.zeros(0, dtype=np.int64),
+            weights=np.concatenate(signs) if signs else None,
+            minlength=n * self.dimensions,
+        ).astype(np.float32).reshape(n, self.dimensions)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        # pgvector's cosine distance is undefined for zero vectors
+        out[norms[:, 0] == 0, 0] = 1.0
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        if len(texts) <= 64:
+            return self.embed(texts)
+        return await asyncio.to_thread(self.embed, texts)
+
+
+@lru_cache
+def _build_provider(name: str, model: str, dimensions: int, ngram_sizes: tuple[int, ...]) -> EmbeddingProvider:
+    if name == "openai":
+        return OpenAIEmbeddingProvider(model, dimensions)
+    if name == "local":
+        return HashingEmbeddingProvider(dimensions, ngram_sizes)
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Provider selected by settings.embedding_provider."""
+    return _build_provider(
+        settings.embedding_provider,
+        settings.embedding_model,
+        settings.embedding_dimensions,
+        tuple(settings.local_embedding_ngram_sizes),
+    )
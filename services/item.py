@@ -1,22 +1,34 @@
 from sqlmodel import Session, text
-from typing import BinaryIO
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import BinaryIO, Iterable, Iterator
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from fastapi import UploadFile, File
 from fastapi import HTTPException
 import csv
+import hashlib
 import io
+import time
+import numpy as np
 from core.config import settings
-from core.config import client
+from core.metrics import INGEST_ROWS, INGEST_ROWS_PER_SECOND, INGEST_STAGE_SECONDS, SEARCH_STAGE_SECONDS, log_timing
+from services.cluster_cache import ITEM_CHANGES_LOCK_KEY, ITEM_COLUMNS, ClusterMembership, cluster_cache, item_payload
+from services.embedding import agenerate_embeddings_array, generate_embeddings_array
+from services.pg_copy import (
+    BINARY_HEADER,
+    BINARY_TRAILER,
+    NULL_FIELD,
+    IteratorStream,
+    encode_int4,
+    encode_numeric,
+    encode_text,
+    encode_tuple,
+    encode_vector_text,
+    encode_vectors,
+)
 
 
 
-def generate_embeddings_batch(texts: list[str]) -> list[list[float]]:
-    """Generate embeddings for multiple texts at once."""
-    response = client.embeddings.create(
-        input=texts,
-        model="text-embedding-3-small"
-    )
-    return [item.embedding for item in response.data]
-
 def detect_format_from_header(header: list[str]) -> str:
     if "produto" in header and "preco" in header:
         return "t1"
@@ -24,8 +36,56 @@ def detect_format_from_header(header: list[str]) -> str:
         return "t2"
     raise ValueError("Unknown CSV format")
 
-def normalize_csv(file) -> io.StringIO:
-    """Normalize CSV and generate embeddings in batches."""
+INGEST_COLUMNS = [
+    "created_by",
+    "business_id",
+    "name",
+    "brand_name",
+    "description",
+    "price",
+    "stock",
+    "category",
+    "unit_type",
+    "name_description_embedding",
+    "supplier",
+    "content_hash",
+]
+
+# Mapped fields covered by content_hash
+CONTENT_FIELDS = ("business_id", "name", "brand_name", "description", "price", "stock", "category", "unit_type")
+
+INGEST_MODES = ("append", "upsert")
+
+# Line numbers of rejected rows listed in an ingest summary
+REJECTED_LINES_REPORTED = 100
+
+
+def content_hash(row: dict) -> str:
+    values = ("" if row[field] is None else str(row[field]) for field in CONTENT_FIELDS)
+    return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_normalized_rows(file) -> Iterator[dict]:
+    """Read the uploaded CSV row by row, renaming columns with the detected mapping."""
+    return open_normalized_rows(file)[1]
+
+
+def open_normalized_rows(
+    file,
+    track_supplier: bool = True,
+    rejected: list[int] | None = None,
+    supplier: str | None = None,
+) -> tuple[str, Iterator[dict]]:
+    """
+    Supplier key and the iterator of normalized rows. The key is supplier, or
+    the detected format ("t1"/"t2") when none is given. Each row carries its
+    content_hash and, with track_supplier, the supplier key. Rows without a
+    business_id cannot be keyed and are skipped; their CSV line numbers are
+    appended to rejected.
+    """
+    if rejected is None:
+        rejected = []
+
     file.seek(0)
     input_stream = io.TextIOWrapper(file, encoding="utf-8", newline="")
     reader = csv.DictReader(input_stream)
@@ -35,48 +95,83 @@ def normalize_csv(file) -> io.StringIO:
 
     fmt = detect_format_from_header(reader.fieldnames)
     mapping = settings.t1_mapping if fmt == "t1" else settings.t2_mapping
+    source = {v: k for k, v in mapping.items()}
 
-    # Primeira passada: coleta todos os dados
-    rows_data = []
-    embedding_texts = []
-    
-    for row in reader:
-        name = row.get(next(k for k, v in mapping.items() if v == "name")) or ""
-        description = row.get(next(k for k, v in mapping.items() if v == "description")) or ""
-        
-        rows_data.append({
-            "business_id": row.get(next(k for k, v in mapping.items() if v == "business_id")),
-            "name": name,
-            "brand_name": row.get(next(k for k, v in mapping.items() if v == "brand_name")),
-            "description": description,
-            "price": row.get(next(k for k, v in mapping.items() if v == "price")),
-            "stock": row.get(next((k for k, v in mapping.items() if v == "stock"), None)),
-            "category": row.get(next((k for k, v in mapping.items() if v == "category"), None)),
-            "unit_type": row.get(next((k for k, v in mapping.items() if v == "unit_type"), None)),
+    supplier = supplier or fmt
+    row_supplier = supplier if track_supplier else None
+
+    def rows() -> Iterator[dict]:
+        try:
+            for row in reader:
+                if not (row.get(source["business_id"]) or "").strip():
+                    rejected.append(reader.line_num)
+                    continue
+                yield row
+        finally:
+            # Closing the wrapper would close file, which belongs to the caller
+            input_stream.detach()
+
+    # Header errors surface here rather than midway through COPY
+    return supplier, (
+        with_content_hash({
+            "business_id": row.get(source["business_id"]),
+            "name": row.get(source["name"]) or "",
+            "brand_name": row.get(source["brand_name"]),
+            "description": row.get(source["description"]) or "",
+            "price": row.get(source["price"]),
+            "stock": row.get(source["stock"]) if "stock" in source else None,
+            "category": row.get(source["category"]) if "category" in source else None,
+            "unit_type": row.get(source["unit_type"]) if "unit_type" in source else None,
+            "supplier": row_supplier,
         })
-        
-        embedding_texts.append(f"{name}. {description[:200]}")
-    
-    # Gera todos embeddings de uma vez (OpenAI aceita até 2048 textos por request)
-    embeddings = generate_embeddings_batch(embedding_texts)
-    
-    # Escreve CSV com embeddings
+        for row in rows()
+    )
+
+
+def with_content_hash(row: dict) -> dict:
+    row["content_hash"] = content_hash(row)
+    return row
+
+
+def iter_batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+COPY_FORMATS = ("csv", "binary")
+
+
+def embed_batch(rows_data: list[dict]) -> np.ndarray:
+    """Embeddings of a batch; rows flagged unchanged are not embedded and get a zero row, encoded as NULL."""
+    with INGEST_STAGE_SECONDS.time(stage="embed"):
+        changed = [i for i, row in enumerate(rows_data) if not row.get("unchanged")]
+        if not changed:
+            return np.zeros((len(rows_data), settings.embedding_dimensions), dtype=np.float32)
+        vectors = generate_embeddings_array(
+            [f"{rows_data[i]['name']}. {rows_data[i]['description'][:200]}" for i in changed]
+        )
+        if len(changed) == len(rows_data):
+            return vectors
+        embeddings = np.zeros((len(rows_data), vectors.shape[1]), dtype=vectors.dtype)
+        embeddings[changed] = vectors
+        return embeddings
+
+
+def next_batch(batches: Iterator[list[dict]]) -> list[dict] | None:
+    with INGEST_STAGE_SECONDS.time(stage="parse"):
+        return next(batches, None)
+
+
+def encode_csv_batch(rows_data: list[dict], embeddings: np.ndarray) -> bytes:
     output = io.StringIO()
     writer = csv.writer(output)
-    
-    writer.writerow([
-        "created_by",
-        "business_id",
-        "name",
-        "brand_name",
-        "description",
-        "price",
-        "stock",
-        "category",
-        "unit_type",
-        "name_description_embedding"
-    ])
-    
+
     for row_data, embedding in zip(rows_data, embeddings):
         writer.writerow([
             "system",
@@ -88,11 +183,90 @@ def normalize_csv(file) -> io.StringIO:
             row_data["stock"],
             row_data["category"],
             row_data["unit_type"],
-            embedding  # ou json.dumps(embedding) se preferir
+            "" if row_data.get("unchanged") else encode_vector_text(embedding),
+            row_data.get("supplier"),
+            row_data.get("content_hash"),
         ])
-    
-    output.seek(0)
-    return output
+
+    return output.getvalue().encode("utf-8")
+
+
+def encode_binary_batch(rows_data: list[dict], embeddings: np.ndarray) -> bytes:
+    """Encode a batch as COPY BINARY tuples in INGEST_COLUMNS order."""
+    created_by = encode_text("system")
+    return b"".join(
+        encode_tuple([
+            created_by,
+            encode_text(row_data["business_id"]),
+            encode_text(row_data["name"]),
+            encode_text(row_data["brand_name"]),
+            encode_text(row_data["description"]),
+            encode_numeric(row_data["price"]),
+            encode_int4(row_data["stock"]),
+            encode_text(row_data["category"]),
+            encode_text(row_data["unit_type"]),
+            NULL_FIELD if row_data.get("unchanged") else vector,
+            encode_text(row_data.get("supplier")),
+            encode_text(row_data.get("content_hash")),
+        ])
+        for row_data, vector in zip(rows_data, encode_vectors(embeddings, settings.embedding_storage))
+    )
+
+
+def iter_embedded_batches(rows: Iterable[dict]) -> Iterator[tuple[list[dict], np.ndarray]]:
+    """
+    Yield (rows, embeddings) per batch of settings.ingest_batch_size rows, in
+    order. Up to settings.embedding_concurrency batches are embedded while the
+    caller consumes the current one, so at most that many plus one batches are
+    held in memory. Their provider requests share the process-wide bound of
+    request_embeddings_chunk.
+    """
+    batches = iter_batches(rows, settings.ingest_batch_size)
+    in_flight: deque[tuple[list[dict], Future]] = deque()
+    depth = max(1, settings.embedding_concurrency)
+
+    with ThreadPoolExecutor(max_workers=depth) as pool:
+        while True:
+            while len(in_flight) < depth:
+                rows_data = next_batch(batches)
+                if not rows_data:
+                    break
+                in_flight.append((rows_data, pool.submit(embed_batch, rows_data)))
+
+            if not in_flight:
+                return
+            rows_data, pending = in_flight.popleft()
+            yield rows_data, pending.result()
+
+
+def normalize_csv(file, copy_format: str = "csv", rows: Iterable[dict] | None = None) -> IteratorStream:
+    """
+    Normalize CSV and generate embeddings in batches, streamed as a COPY input
+    file object (CSV with header, or binary) whose peak memory depends on the
+    batch size, not the file size. rows replaces the file's normalized rows,
+    e.g. to drop rows before they are embedded.
+    """
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"Unknown copy format: {copy_format}")
+
+    batches = iter_embedded_batches(iter_normalized_rows(file) if rows is None else rows)
+
+    def csv_chunks() -> Iterator[bytes]:
+        yield (",".join(INGEST_COLUMNS) + "\r\n").encode("utf-8")
+        for rows_data, embeddings in batches:
+            with INGEST_STAGE_SECONDS.time(stage="encode"):
+                chunk = encode_csv_batch(rows_data, embeddings)
+            yield chunk
+
+    def binary_chunks() -> Iterator[bytes]:
+        yield BINARY_HEADER
+        for rows_data, embeddings in batches:
+            with INGEST_STAGE_SECONDS.time(stage="encode"):
+                chunk = encode_binary_batch(rows_data, embeddings)
+            yield chunk
+        yield BINARY_TRAILER
+
+    return IteratorStream(binary_chunks() if copy_format == "binary" else csv_chunks())
 
 
 def copy_from_csv(
@@ -101,9 +275,12 @@ def copy_from_csv(
     file: BinaryIO,
     columns: list[str],
     has_header: bool = True,
+    copy_format: str = "csv",
+    commit: bool = True,
 ):
     """
     PostgreSQL COPY FROM STDIN using an existing SQLModel Session.
+    Returns the number of rows copied.
     """
 
     # Get raw psycopg connection
@@ -111,193 +288,734 @@ def copy_from_csv(
     cursor = raw_conn.cursor()
 
     cols = ", ".join(columns)
-    header = "HEADER" if has_header else ""
+
+    if copy_format == "binary":
+        options = "FORMAT BINARY"
+    else:
+        options = "FORMAT CSV, HEADER" if has_header else "FORMAT CSV"
 
     sql = f"""
         COPY {table_name} ({cols})
         FROM STDIN
-        WITH (FORMAT CSV, {header})
+        WITH ({options})
     """
 
     cursor.copy_expert(sql, file)
+    rowcount = cursor.rowcount
 
     # IMPORTANT: commit via Session, not raw_conn
+    if commit:
+        db.commit()
+    return rowcount
+
+
+STAGE_TABLE = "raw_item_stage"
+
+UPSERT_COLUMNS = ", ".join(INGEST_COLUMNS)
+UPDATED_COLUMNS = ",\n            ".join(
+    f"{column} = EXCLUDED.{column}"
+    for column in INGEST_COLUMNS
+    if column not in ("created_by", "supplier", "business_id")
+)
+
+UPSERT_SQL = f"""
+    WITH upserted AS (
+        INSERT INTO raw_item ({UPSERT_COLUMNS})
+        SELECT DISTINCT ON (supplier, business_id) {UPSERT_COLUMNS}
+        FROM {STAGE_TABLE}
+        -- The last occurrence of a business_id in the file wins
+        ORDER BY supplier, business_id, ord DESC
+        ON CONFLICT (supplier, business_id) WHERE supplier IS NOT NULL DO UPDATE SET
+            {UPDATED_COLUMNS},
+            updated_at = now(),
+            updated_by = EXCLUDED.created_by,
+            relink_pending = true,
+            changed_seq = :changed_seq
+        WHERE raw_item.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE inserted) AS inserted,
+        COUNT(*) FILTER (WHERE NOT inserted) AS updated,
+        (SELECT COUNT(*) FROM {STAGE_TABLE}) AS staged,
+        (SELECT COUNT(DISTINCT business_id) FROM {STAGE_TABLE}) AS distinct_items
+    FROM upserted
+"""
+
+
+def mark_unchanged_rows(db: Session, rows: Iterable[dict], supplier: str) -> Iterator[dict]:
+    """
+    Flag rows whose content_hash matches the stored row of their business_id,
+    so they are staged without an embedding. Every occurrence is still staged,
+    since which row of a repeated business_id wins is decided in the staging
+    table. Stored hashes are looked up per batch on a connection of their own,
+    as the session's is busy with COPY.
+    """
+    with db.get_bind().connect() as conn:
+        for batch in iter_batches(rows, settings.ingest_batch_size):
+            stored = dict(
+                conn.execute(
+                    text(
+                        """
+                        SELECT business_id, content_hash
+                        FROM raw_item
+                        WHERE supplier = :supplier AND business_id = ANY(:business_ids)
+                        """
+                    ),
+                    {"supplier": supplier, "business_ids": [row["business_id"] for row in batch]},
+                ).all()
+            )
+            for row in batch:
+                row["unchanged"] = stored.get(row["business_id"]) == row["content_hash"]
+                yield row
+
+
+def upsert_items(db: Session, file: BinaryIO, copy_format: str, supplier: str | None = None) -> dict:
+    """
+    Upsert a supplier file on (supplier, business_id): rows are COPYed into a
+    transaction-local staging table, embedded only if new or changed, and the
+    last row of each business_id is merged with INSERT ... ON CONFLICT DO
+    UPDATE when its mapped fields changed. A last row that was not embedded
+    matches the stored one, so it never writes its NULL embedding. supplier
+    defaults to the CSV format, which suppliers sharing a layout must not rely on.
+    """
+    rejected: list[int] = []
+    supplier, rows = open_normalized_rows(file, rejected=rejected, supplier=supplier)
+    connection = db.connection()
+
+    connection.exec_driver_sql(
+        f"CREATE TEMP TABLE {STAGE_TABLE} ON COMMIT DROP AS SELECT {UPSERT_COLUMNS} FROM raw_item WITH NO DATA"
+    )
+    connection.exec_driver_sql(f"ALTER TABLE {STAGE_TABLE} ADD COLUMN ord bigserial")
+
+    copy_from_csv(
+        db=db,
+        table_name=STAGE_TABLE,
+        file=normalize_csv(file, copy_format, rows=mark_unchanged_rows(db, rows, supplier)),
+        columns=INGEST_COLUMNS,
+        copy_format=copy_format,
+        commit=False,
+    )
+
+    # Held until commit, so cluster caches never read a changed_seq whose rows are not visible yet
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ITEM_CHANGES_LOCK_KEY})
+    changed_seq = connection.execute(text("SELECT nextval('raw_item_changes_seq')")).scalar_one()
+    inserted, updated, staged, distinct_items = connection.execute(
+        text(UPSERT_SQL), {"changed_seq": changed_seq}
+    ).one()
     db.commit()
 
+    if updated:
+        cluster_cache.invalidate()
+
+    return {
+        "rows": staged + len(rejected),
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": distinct_items - inserted - updated,
+        "superseded": staged - distinct_items,
+        **rejected_summary(rejected),
+    }
+
+
+def append_items(db: Session, file: BinaryIO, copy_format: str) -> dict:
+    """COPY every row straight into raw_item, without a supplier key."""
+    rejected: list[int] = []
+    _, rows = open_normalized_rows(file, track_supplier=False, rejected=rejected)
+    copied = copy_from_csv(
+        db=db,
+        table_name="raw_item",
+        file=normalize_csv(file, copy_format, rows=rows),
+        columns=INGEST_COLUMNS,
+        copy_format=copy_format,
+    )
+    return {
+        "rows": copied + len(rejected),
+        "inserted": copied,
+        "updated": 0,
+        "unchanged": 0,
+        "superseded": 0,
+        **rejected_summary(rejected),
+    }
+
+
+def rejected_summary(rejected: list[int]) -> dict:
+    return {"rejected": len(rejected), "rejected_lines": rejected[:REJECTED_LINES_REPORTED]}
+
+
 def ingest_items_csv(
     db: Session,
     file: UploadFile = File(...),
-):
+    mode: str | None = None,
+    supplier: str | None = None,
+) -> dict:
     
-    """Ingest items from uploaded CSV file."""
+    """
+    Ingest items from uploaded CSV file. Returns rows read and inserted, updated,
+    unchanged, superseded and rejected counts; rows without a business_id are
+    rejected.
+    supplier keys upserted rows and defaults to the CSV format.
+    """
+    mode = mode or settings.ingest_mode
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode: {mode}")
+
     if not file.filename.endswith(".csv"):
         raise HTTPException(400, "Invalid file type")
 
-    if file.size and file.size > settings.max_size:
+    if settings.max_size and file.size and file.size > settings.max_size:
         raise HTTPException(413, "File too large")
-    
-    normalized_file = normalize_csv(file.file)
 
-    copy_from_csv(
-    db=db,
-    table_name="raw_item",
-    file=normalized_file,
-    columns=[
-        "created_by",
-        "business_id",
-        "name",
-        "brand_name",
-        "description",
-        "price",
-        "stock",
-        "category",
-        "unit_type",
-        "name_description_embedding",
-    ])
-    return None
-
-def search_items_with_clusters(db: Session, query: str, top_k: int = 10):
-    """Search nearest items by embedding and include cluster ids only from the latest snapshot run. Also return associated items per found cluster."""
-    embedding = generate_embeddings_batch([query])[0]
-    emb_str = "[" + ",".join(str(x) for x in embedding) + "]"
-
-    # Get latest cluster_run_id by created_at
-    latest_run_sql = text(
-        """
-        SELECT ics.cluster_run_id
-        FROM item_cluster_snapshot ics
-        ORDER BY ics.created_at DESC
-        LIMIT 1
-        """
+    # The copy stage spans the whole upload: parse, embed and encode run as COPY pulls input
+    start = time.perf_counter()
+    if mode == "upsert":
+        counts = upsert_items(db, file.file, settings.ingest_copy_format, supplier)
+    else:
+        counts = append_items(db, file.file, settings.ingest_copy_format)
+    seconds = time.perf_counter() - start
+
+    INGEST_STAGE_SECONDS.observe(seconds, stage="copy")
+    INGEST_ROWS.inc(counts["inserted"] + counts["updated"])
+    if seconds > 0:
+        INGEST_ROWS_PER_SECOND.set(counts["rows"] / seconds)
+    log_timing(
+        "ingest",
+        filename=file.filename,
+        mode=mode,
+        **{key: value for key, value in counts.items() if key != "rejected_lines"},
+        ms=round(seconds * 1000, 3),
     )
-    latest_row = db.exec(latest_run_sql).first()
-    latest_run_id = latest_row[0] if latest_row else None
+    return {"mode": mode, **counts}
 
-    # Build query filtering snapshots to the latest run
-    if latest_run_id is not None:
-        sql = text(
+SEARCH_FORMATS = ("full", "compact")
+SEARCH_MODES = ("vector", "hybrid", "cluster")
+
+# Search filter -> condition on raw_item ri, bound under the filter's name
+SEARCH_FILTERS = {
+    "price_min": "ri.price >= :price_min",
+    "price_max": "ri.price <= :price_max",
+    "category": "ri.category = :category",
+    "brand_name": "ri.brand_name = :brand_name",
+}
+
+
+def search_filter_sql(filters: dict) -> str:
+    unknown = set(filters) - set(SEARCH_FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown search filters: {sorted(unknown)}")
+    return " AND ".join(SEARCH_FILTERS[name] for name in filters) or "TRUE"
+
+
+def knn_order(embedding: str, exact: bool) -> str:
+    """
+    kNN sort key. The exact variant is an expression the HNSW index cannot
+    serve, so the planner scans the filtered rows (through the btree indexes)
+    and sorts them.
+    """
+    distance = f"ri.name_description_embedding <=> {embedding}"
+    return f"({distance}) + 0" if exact else distance
+
+
+def vector_search_sql(query_text: str, embedding: str, filters: str = "TRUE", exact: bool = False) -> str:
+    """kNN over the cosine HNSW index. query_text is unused, kept for a common signature with hybrid_search_sql."""
+    return f"""
+        SELECT {ITEM_COLUMNS},
+            (ri.name_description_embedding <=> {embedding}) AS distance,
+            CAST(NULL AS float8) AS score
+        FROM raw_item ri
+        WHERE {filters}
+        ORDER BY {knn_order(embedding, exact)}
+        LIMIT :k
+    """
+
+
+def hybrid_search_sql(query_text: str, embedding: str, filters: str = "TRUE", exact: bool = False) -> str:
+    """
+    Reciprocal-rank fusion of an HNSW kNN leg and a trigram leg, each limited
+    to :candidates hits. The trigram leg filters with <% so both columns' GIN
+    indexes are used (BitmapOr) and ranks by the best word_similarity.
+    """
+    return f"""
+        WITH vec AS (
+            SELECT v.id, v.distance, row_number() OVER (ORDER BY v.distance, v.id) AS rank
+            FROM (
+                SELECT ri.id, (ri.name_description_embedding <=> {embedding}) AS distance
+                FROM raw_item ri
+                WHERE {filters}
+                ORDER BY {knn_order(embedding, exact)}
+                LIMIT :candidates
+            ) v
+        ),
+        lex AS (
+            SELECT l.id, row_number() OVER (ORDER BY l.sim DESC, l.id) AS rank
+            FROM (
+                SELECT ri.id, GREATEST(word_similarity({query_text}, ri.name), word_similarity({query_text}, ri.description)) AS sim
+                FROM raw_item ri
+                WHERE ({query_text} <% ri.name OR {query_text} <% ri.description) AND {filters}
+                ORDER BY sim DESC
+                LIMIT :candidates
+            ) l
+        ),
+        fused AS (
+            SELECT ranked.id, SUM(1.0 / (:rrf_k + ranked.rank)) AS score
+            FROM (SELECT id, rank FROM vec UNION ALL SELECT id, rank FROM lex) ranked
+            GROUP BY ranked.id
+        )
+        SELECT {ITEM_COLUMNS}, vec.distance, CAST(fused.score AS float8) AS score
+        FROM fused
+        JOIN raw_item ri ON ri.id = fused.id
+        LEFT JOIN vec ON vec.id = fused.id
+        ORDER BY fused.score DESC, vec.distance NULLS LAST, ri.id
+        LIMIT :k
+    """
+
+
+SEARCH_SQL = {"vector": vector_search_sql, "hybrid": hybrid_search_sql}
+
+
+def search_params(mode: str, top_k: int) -> dict:
+    if mode == "hybrid":
+        return {"k": top_k, "candidates": max(settings.search_candidates, top_k), "rrf_k": settings.search_rrf_k}
+    return {"k": top_k}
+
+
+async def configure_search(db: AsyncSession, top_k: int):
+    """
+    Transaction-local ef_search (an HNSW scan returns at most ef_search rows),
+    trigram threshold and iterative scan, which lets a filtered HNSW scan go
+    on past ef_search until top_k rows pass the filters or max_scan_tuples is hit.
+    """
+    await db.exec(
+        text(
             """
-            SELECT 
-                ri.id,
-                ri.business_id,
-                ri.name,
-                ri.brand_name,
-                ri.description,
-                ri.price,
-                ri.stock,
-                ri.category,
-                ri.unit_type,
-                ics.cluster_id,
-                (ri.name_description_embedding <-> CAST(:emb AS vector(1536))) AS distance
-            FROM raw_item ri
-            LEFT JOIN item_cluster_snapshot ics 
-                ON ics.raw_item_id = ri.id AND ics.cluster_run_id = :run_id
-            ORDER BY ri.name_description_embedding <-> CAST(:emb AS vector(1536))
-            LIMIT :k
+            SELECT set_config('hnsw.ef_search', :ef_search, true),
+                set_config('pg_trgm.word_similarity_threshold', :threshold, true),
+                set_config('hnsw.iterative_scan', :iterative_scan, true),
+                set_config('hnsw.max_scan_tuples', :max_scan_tuples, true)
             """
+        ),
+        params={
+            "ef_search": str(max(settings.search_candidates, settings.search_cluster_candidates, top_k)),
+            "threshold": str(settings.search_trigram_threshold),
+            "iterative_scan": settings.search_iterative_scan,
+            "max_scan_tuples": str(settings.search_max_scan_tuples),
+        },
+    )
+
+
+async def exact_business_id_rows(db: AsyncSession, queries: list[str], filters: dict) -> list:
+    """Items whose business_id equals one of the queries and that pass the filters, as search rows."""
+    return (
+        await db.exec(
+            text(
+                f"""
+                SELECT {ITEM_COLUMNS}, CAST(NULL AS float8) AS distance, CAST(NULL AS float8) AS score
+                FROM raw_item ri
+                WHERE ri.business_id = ANY(:queries) AND {search_filter_sql(filters)}
+                ORDER BY ri.id
+                """
+            ),
+            params={"queries": queries, **filters},
         )
-        rows = db.exec(sql.bindparams(emb=emb_str, run_id=latest_run_id, k=top_k)).fetchall()
-    else:
-        # Fallback without clusters if none exist
+    ).fetchall()
+
+
+async def knn_rows(db: AsyncSession, mode: str, query: str, emb_str: str, top_k: int, filters: dict) -> list:
+    """
+    Search rows of one query. A filtered search that comes back short of top_k
+    (the iterative scan hit max_scan_tuples) is repeated as an exact scan of
+    the rows passing the filters, so the filtered top_k is exact.
+    """
+    params = {"emb": emb_str, **search_params(mode, top_k), **filters}
+    if mode == "hybrid":
+        params["q"] = query
+
+    await configure_search(db, top_k)
+    for exact in (False, True):
         sql = text(
+            SEARCH_SQL[mode](
+                ":q", f"CAST(:emb AS {settings.embedding_sql_type})", search_filter_sql(filters), exact
+            )
+        )
+        rows = (await db.exec(sql, params=params)).fetchall()
+        if not filters or len(rows) >= top_k:
+            break
+    return rows
+
+
+async def knn_rows_batch(
+    db: AsyncSession,
+    mode: str,
+    queries: list[str],
+    embeddings: np.ndarray,
+    top_k: int,
+    filters: dict,
+) -> list[list]:
+    """knn_rows for many queries in one round trip (unnest + LATERAL); short filtered results are redone exactly."""
+    rows_by_query: list[list] = [[] for _ in queries]
+    pending = list(range(len(queries)))
+    await configure_search(db, top_k)
+
+    for exact in (False, True):
+        # vector[] literal; each element is a quoted pgvector text value
+        embs_str = "{" + ",".join(f'"{encode_vector_text(embeddings[position])}"' for position in pending) + "}"
+        sql = text(
+            f"""
+            SELECT q.ord, ri.*
+            FROM unnest(CAST(:embs AS {settings.embedding_sql_type}[]), CAST(:queries AS text[]))
+                WITH ORDINALITY AS q(emb, query, ord)
+            CROSS JOIN LATERAL ({SEARCH_SQL[mode]("q.query", "q.emb", search_filter_sql(filters), exact)}) ri
+            ORDER BY q.ord, ri.score DESC NULLS LAST, ri.distance, ri.id
             """
-            SELECT 
-                ri.id,
-                ri.business_id,
-                ri.name,
-                ri.brand_name,
-                ri.description,
-                ri.price,
-                ri.stock,
-                ri.category,
-                ri.unit_type,
-                NULL AS cluster_id,
-                (ri.name_description_embedding <-> CAST(:emb AS vector(1536))) AS distance
-            FROM raw_item ri
-            ORDER BY ri.name_description_embedding <-> CAST(:emb AS vector(1536))
-            LIMIT :k
-            """
         )
-        rows = db.exec(sql.bindparams(emb=emb_str, k=top_k)).fetchall()
+        params = {
+            "embs": embs_str,
+            "queries": [queries[position] for position in pending],
+            **search_params(mode, top_k),
+            **filters,
+        }
+        rows = (await db.exec(sql, params=params)).fetchall()
+
+        found: dict[int, list] = {}
+        for row in rows:
+            found.setdefault(pending[row.ord - 1], []).append(row)
+        for position in pending:
+            rows_by_query[position] = found.get(position, [])
+
+        if not filters:
+            break
+        pending = [position for position in pending if len(rows_by_query[position]) < top_k]
+        if not pending:
+            break
+
+    return rows_by_query
+
+
+async def cluster_knn_rows_batch(
+    db: AsyncSession,
+    membership: ClusterMembership,
+    embeddings: np.ndarray,
+    top_k: int,
+    filters: dict,
+) -> list[list]:
+    """
+    Two-stage search: the search_cluster_candidates nearest centroids of the
+    membership's run, then the members of those clusters ranked by their own
+    distance, top_k per query. Two round trips for any number of queries.
+    """
+    # vector[] literal; each element is a quoted pgvector text value
+    embs_str = "{" + ",".join(f'"{encode_vector_text(e)}"' for e in embeddings) + "}"
+    await configure_search(db, top_k)
+
+    nearest = (
+        await db.exec(
+            text(
+                f"""
+                SELECT q.ord, c.cluster_id
+                FROM unnest(CAST(:embs AS {settings.embedding_sql_type}[])) WITH ORDINALITY AS q(emb, ord)
+                CROSS JOIN LATERAL (
+                    SELECT ic.cluster_id
+                    FROM item_cluster ic
+                    WHERE ic.cluster_run_id = :run_id
+                    ORDER BY ic.centroid <=> q.emb
+                    LIMIT :clusters
+                ) c
+                """
+            ),
+            params={"embs": embs_str, "run_id": membership.run_id, "clusters": settings.search_cluster_candidates},
+        )
+    ).fetchall()
+
+    # Candidate items as parallel (query ordinal, item id) arrays
+    candidate_ords: list[int] = []
+    candidate_ids: list[int] = []
+    for row in nearest:
+        member_ids = membership.member_ids_of(row.cluster_id)
+        candidate_ords.extend([row.ord] * len(member_ids))
+        candidate_ids.extend(member_ids)
+
+    rows_by_query: list[list] = [[] for _ in embeddings]
+    if not candidate_ids:
+        return rows_by_query
+
+    rows = (
+        await db.exec(
+            text(
+                f"""
+                SELECT ranked.*
+                FROM (
+                    SELECT c.ord, {ITEM_COLUMNS},
+                        (ri.name_description_embedding <=> q.emb) AS distance,
+                        CAST(NULL AS float8) AS score,
+                        row_number() OVER (
+                            PARTITION BY c.ord ORDER BY ri.name_description_embedding <=> q.emb, ri.id
+                        ) AS position
+                    FROM unnest(CAST(:ords AS bigint[]), CAST(:ids AS bigint[])) AS c(ord, id)
+                    JOIN unnest(CAST(:embs AS {settings.embedding_sql_type}[])) WITH ORDINALITY AS q(emb, ord)
+                        ON q.ord = c.ord
+                    JOIN raw_item ri ON ri.id = c.id
+                    WHERE {search_filter_sql(filters)}
+                ) ranked
+                WHERE ranked.position <= :k
+                ORDER BY ranked.ord, ranked.position
+                """
+            ),
+            params={"ords": candidate_ords, "ids": candidate_ids, "embs": embs_str, "k": top_k, **filters},
+        )
+    ).fetchall()
+
+    for row in rows:
+        rows_by_query[row.ord - 1].append(row)
+    return rows_by_query
+
+
+async def centroid_membership(mode: str) -> ClusterMembership | None:
+    """The active run's membership when "cluster" search can use its centroids."""
+    if mode != "cluster":
+        return None
+    membership = await cluster_cache.get()
+    return membership if membership is not None and membership.has_centroids else None
 
+
+def attach_cluster_context(
+    rows,
+    membership: ClusterMembership | None,
+    max_associated_items: int,
+) -> list[dict]:
+    """Build SearchItemResult dicts from kNN rows, resolving clusters in memory."""
     items: dict[int, dict] = {}
-    cluster_ids: set[int] = set()
     for row in rows:
-        item_id = row.id
-        if item_id not in items:
-            items[item_id] = {
+        if row.id in items:
+            continue
+        item = item_payload(row)
+        item["distance"] = float(row.distance) if row.distance is not None else None
+        item["score"] = row.score
+        item["cluster_ids"] = []
+        item["associated_items"] = {}
+        item["cluster_sizes"] = {}
+
+        cluster_id = membership.cluster_of(row.id) if membership else None
+        if cluster_id is not None:
+            members = membership.members_of(cluster_id)
+            item["cluster_ids"].append(cluster_id)
+            item["cluster_sizes"][cluster_id] = max(len(members), 1)
+            # Associated items exclude the item itself
+            item["associated_items"][cluster_id] = [
+                member for member in members[:max_associated_items + 1] if member["id"] != row.id
+            ][:max_associated_items]
+        items[row.id] = item
+
+    return list(items.values())
+
+
+def compact_cluster_context(
+    rows_by_query: list[list],
+    membership: ClusterMembership | None,
+    max_associated_items: int,
+) -> tuple[list[list[dict]], dict[int, dict], dict[int, dict]]:
+    """
+    CompactSearchHit lists per query, plus the clusters and items tables they
+    share: every item payload is emitted once however many hits or clusters
+    refer to it.
+    """
+    hits_by_query: list[list[dict]] = []
+    clusters: dict[int, dict] = {}
+    items: dict[int, dict] = {}
+
+    for rows in rows_by_query:
+        hits: list[dict] = []
+        seen: set[int] = set()
+        for row in rows:
+            if row.id in seen:
+                continue
+            seen.add(row.id)
+            if row.id not in items:
+                items[row.id] = item_payload(row)
+
+            cluster_id = membership.cluster_of(row.id) if membership else None
+            if cluster_id is not None and cluster_id not in clusters:
+                members = membership.members_of(cluster_id)
+                # A singleton has no members entry; its one member is the hit itself
+                member_ids = [member["id"] for member in members] or [cluster_id]
+                clusters[cluster_id] = {
+                    "size": len(member_ids),
+                    "member_ids": member_ids[:max_associated_items],
+                }
+                for member in members[:max_associated_items]:
+                    items.setdefault(member["id"], member)
+
+            hits.append({
                 "id": row.id,
-                "business_id": row.business_id,
-                "name": row.name,
-                "brand_name": row.brand_name,
-                "description": row.description,
-                "price": str(row.price) if row.price is not None else None,
-                "stock": row.stock,
-                "category": row.category,
-                "unit_type": row.unit_type,
                 "distance": float(row.distance) if row.distance is not None else None,
-                "cluster_ids": [],
-                "associated_items": {}
-            }
-        if row.cluster_id is not None and row.cluster_id not in items[item_id]["cluster_ids"]:
-            items[item_id]["cluster_ids"].append(row.cluster_id)
-            cluster_ids.add(row.cluster_id)
+                "score": row.score,
+                "cluster_id": cluster_id,
+            })
+        hits_by_query.append(hits)
 
-    # If we have clusters and latest_run_id, fetch associated items for those clusters
-    if latest_run_id is not None and cluster_ids:
-        assoc_sql = text(
-            """
-            SELECT 
-                ics.cluster_id,
-                ri.id,
-                ri.business_id,
-                ri.name,
-                ri.brand_name,
-                ri.description,
-                ri.price,
-                ri.stock,
-                ri.category,
-                ri.unit_type
-            FROM item_cluster_snapshot ics
-            JOIN raw_item ri ON ri.id = ics.raw_item_id
-            WHERE ics.cluster_run_id = :run_id
-              AND ics.cluster_id = ANY(:cluster_ids)
-            """
-        )
-        assoc_rows = db.exec(assoc_sql.bindparams(run_id=latest_run_id, cluster_ids=list(cluster_ids))).fetchall()
-
-        # Build a mapping cluster_id -> dict of associated items keyed by id (to avoid duplicates)
-        cluster_to_items: dict[int, dict[int, dict]] = {}
-        for arow in assoc_rows:
-            cid = arow.cluster_id
-            if cid not in cluster_to_items:
-                cluster_to_items[cid] = {}
-            # Upsert by id to keep one copy and avoid duplicates
-            cluster_to_items[cid][arow.id] = {
-                "id": arow.id,
-                "business_id": arow.business_id,
-                "name": arow.name,
-                "brand_name": arow.brand_name,
-                "description": arow.description,
-                "price": str(arow.price) if arow.price is not None else None,
-                "stock": arow.stock,
-                "category": arow.category,
-                "unit_type": arow.unit_type,
+    return hits_by_query, clusters, items
+
+
+async def search_items_with_clusters(
+    db: AsyncSession,
+    query: str,
+    top_k: int = 10,
+    response_format: str = "full",
+    max_associated_items: int | None = None,
+    mode: str | None = None,
+    filters: dict | None = None,
+) -> dict:
+    """
+    Search nearest items by embedding and include cluster ids from the active snapshot run. Also return associated items per found cluster.
+    In hybrid mode an exact business_id match is returned as is, otherwise
+    vector and trigram hits are fused by reciprocal rank. In cluster mode the
+    members of the nearest cluster centroids are ranked, topped up by vector
+    search when they hold fewer than top_k matches; runs without centroids
+    are searched in vector mode. filters (see SEARCH_FILTERS) restrict the
+    candidates inside the kNN query.
+    Returns a SearchItemsResponse body, or a CompactSearchResponse body when response_format is "compact".
+    """
+    mode = mode or settings.search_mode
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if response_format not in SEARCH_FORMATS:
+        raise ValueError(f"Unknown search format: {response_format}")
+    if max_associated_items is None:
+        max_associated_items = settings.search_max_associated_items
+
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    # Unknown filters fail before anything is embedded
+    search_filter_sql(filters)
+
+    rows = []
+    if mode == "hybrid":
+        with SEARCH_STAGE_SECONDS.time(kind="single", stage="exact"):
+            rows = (await exact_business_id_rows(db, [query], filters))[:top_k]
+
+    if not rows:
+        with SEARCH_STAGE_SECONDS.time(kind="single", stage="embed"):
+            embedding = (await agenerate_embeddings_array([query]))[0]
+
+        with SEARCH_STAGE_SECONDS.time(kind="single", stage="knn"):
+            centroids = await centroid_membership(mode)
+            if centroids is not None:
+                rows = (await cluster_knn_rows_batch(db, centroids, embedding[None, :], top_k, filters))[0]
+            if centroids is None or len(rows) < top_k:
+                knn_mode = "vector" if mode == "cluster" else mode
+                rows = await knn_rows(db, knn_mode, query, encode_vector_text(embedding), top_k, filters)
+
+    with SEARCH_STAGE_SECONDS.time(kind="single", stage="clusters"):
+        membership = await cluster_cache.get()
+        if response_format == "compact":
+            (hits,), clusters, items = compact_cluster_context([rows], membership, max_associated_items)
+            return {"results": hits, "clusters": clusters, "items": items}
+        return {"results": attach_cluster_context(rows, membership, max_associated_items)}
+
+
+async def search_items_batch_with_clusters(
+    db: AsyncSession,
+    queries: list[str],
+    top_k: int = 10,
+    response_format: str = "full",
+    max_associated_items: int | None = None,
+    mode: str | None = None,
+    filters: dict | None = None,
+) -> dict:
+    """
+    Search many queries at once: one embedding request, one kNN round trip
+    (unnest + LATERAL) and one cluster membership lookup. Returns, per query
+    and in input order, the same results as search_items_with_clusters; in
+    the compact format the clusters and items tables are shared by all queries.
+    Cluster mode searches centroids as in search_items_with_clusters.
+    In hybrid mode queries answered by an exact business_id match are neither
+    embedded nor searched. filters apply to every query.
+    """
+    mode = mode or settings.search_mode
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if response_format not in SEARCH_FORMATS:
+        raise ValueError(f"Unknown search format: {response_format}")
+    if max_associated_items is None:
+        max_associated_items = settings.search_max_associated_items
+
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    # Unknown filters fail before anything is embedded
+    search_filter_sql(filters)
+
+    rows_by_query: list[list] = [[] for _ in queries]
+    if mode == "hybrid":
+        with SEARCH_STAGE_SECONDS.time(kind="batch", stage="exact"):
+            exact_rows = await exact_business_id_rows(db, list(set(queries)), filters)
+        exact: dict[str, list] = {}
+        for row in exact_rows:
+            exact.setdefault(row.business_id, []).append(row)
+        for position, query in enumerate(queries):
+            rows_by_query[position] = exact.get(query, [])[:top_k]
+
+    # Positions still to search
+    pending = [position for position, query_rows in enumerate(rows_by_query) if not query_rows]
+    if pending:
+        pending_queries = [queries[position] for position in pending]
+        with SEARCH_STAGE_SECONDS.time(kind="batch", stage="embed"):
+            embeddings = await agenerate_embeddings_array(pending_queries)
+
+        with SEARCH_STAGE_SECONDS.time(kind="batch", stage="knn"):
+            centroids = await centroid_membership(mode)
+            if centroids is None:
+                knn_mode = "vector" if mode == "cluster" else mode
+                pending_rows = await knn_rows_batch(db, knn_mode, pending_queries, embeddings, top_k, filters)
+            else:
+                pending_rows = await cluster_knn_rows_batch(db, centroids, embeddings, top_k, filters)
+                short = [index for index, query_rows in enumerate(pending_rows) if len(query_rows) < top_k]
+                if short:
+                    refill = await knn_rows_batch(
+                        db, "vector", [pending_queries[index] for index in short], embeddings[short], top_k, filters
+                    )
+                    for index, query_rows in zip(short, refill):
+                        pending_rows[index] = query_rows
+
+        for position, query_rows in zip(pending, pending_rows):
+            rows_by_query[position] = query_rows
+
+    with SEARCH_STAGE_SECONDS.time(kind="batch", stage="clusters"):
+        membership = await cluster_cache.get()
+        if response_format == "compact":
+            hits_by_query, clusters, items = compact_cluster_context(rows_by_query, membership, max_associated_items)
+            return {
+                "results": [{"query": query, "results": hits} for query, hits in zip(queries, hits_by_query)],
+                "clusters": clusters,
+                "items": items,
             }
+        return {
+            "results": [
+                {"query": query, "results": attach_cluster_context(query_rows, membership, max_associated_items)}
+                for query, query_rows in zip(queries, rows_by_query)
+            ]
+        }
 
-        # Attach to each result only the clusters it belongs to, with de-duplicated associated items and excluding the item itself
-        for item in items.values():
-            assoc = {}
-            for cid in item["cluster_ids"]:
-                # Get items dict for this cluster and remove the current item id if present
-                items_dict = cluster_to_items.get(cid, {})
-                if items_dict:
-                    # Build a unique list excluding the current item
-                    assoc[cid] = [v for iid, v in items_dict.items() if iid != item["id"]]
-                else:
-                    assoc[cid] = []
-            item["associated_items"] = assoc
 
-    return list(items.values())
+async def get_cluster_members(db: AsyncSession, cluster_id: int, offset: int = 0, limit: int = 50) -> dict | None:
+    """
+    One page of a cluster's members in the active run, ordered by item id, or
+    None when the cluster does not exist. Singletons are not kept in the
+    membership cache; their cluster id is their own item id.
+    """
+    membership = await cluster_cache.get()
+    if membership is None:
+        return None
 
+    members = membership.members_of(cluster_id)
+    if not members:
+        if membership.cluster_of(cluster_id) != cluster_id:
+            return None
+        row = (
+            await db.exec(text(f"SELECT {ITEM_COLUMNS} FROM raw_item ri WHERE ri.id = :id"), params={"id": cluster_id})
+        ).first()
+        members = [item_payload(row)] if row else []
 
+    return {
+        "cluster_id": cluster_id,
+        "size": len(members),
+        "offset": offset,
+        "limit": limit,
+        "items": members[offset:offset + limit],
+    }
@@ -2,78 +2,647 @@ from core.config import settings
 from core.database import engine
 from sqlmodel import text
 import numpy as np
-import pandas as pd
-import networkx as nx
 import uuid
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable
 from sqlalchemy import insert
-from models.item_cluster_snapshot import ItemClusterSnapshot
+from models.cluster_run import ClusterRun
+from services.cluster_centroids import attach_centroid_partition, build_centroids, create_centroid_partition
+from services.snapshot import (
+    SNAPSHOT_STORAGES,
+    attach_snapshot_partition,
+    changed_rows,
+    copy_snapshot,
+    create_snapshot_partition,
+    load_snapshot,
+    run_chain,
+)
+from services.union_find import ArrayUnionFind
 
 
-def persist_clusters_bulk_engine(engine, rows: list[dict]):
-    if not rows:
-        return
+LINK_MODES = ("full", "incremental")
+CANDIDATE_MODES = ("exact", "ann")
+LINK_MODELS = ("svm", "threshold")
+LINK_STAGES = ("candidates", "scoring", "graph", "persist")
 
-    stmt = insert(ItemClusterSnapshot)
+# pg advisory lock key held for the duration of a run, so only one runs at a time
+LINK_LOCK_KEY = 726_100_001
 
+logger = logging.getLogger(__name__)
+
+_mp = multiprocessing.get_context("spawn")
+
+
+class LinkJobCancelled(Exception):
+    """Raised at a stage boundary when the run was asked to stop."""
+
+
+class LinkJobBusy(Exception):
+    """Raised when another link run holds the link lock."""
+
+
+class LinkProgress:
+    """Receives stage notifications from a link run. The default does nothing."""
+
+    @contextmanager
+    def stage(self, name: str):
+        self.check_cancelled()
+        yield
+
+    def check_cancelled(self):
+        pass
+
+
+def persist_clusters_bulk_engine(
+    engine,
+    run: dict,
+    item_ids: np.ndarray,
+    cluster_ids: np.ndarray,
+    relinked: list[tuple[int, str]] = (),
+):
+    """
+    COPY snapshot rows into a new partition for the run, attach it and insert
+    the cluster_run record in one transaction, moving the active run pointer to it.
+    With settings.cluster_centroids the run's centroids are built in the same
+    transaction. relinked holds the (id, content_hash) of the relink_pending
+    rows the run read; their flag is cleared unless they changed again since.
+    """
+    run_id = run["cluster_run_id"]
     with engine.begin() as conn:
-        conn.execute(stmt, rows)
+        if relinked:
+            ids, hashes = zip(*relinked)
+            conn.execute(
+                text(
+                    """
+                    UPDATE raw_item ri
+                    SET relink_pending = false
+                    FROM unnest(CAST(:ids AS bigint[]), CAST(:hashes AS varchar[])) AS r(id, content_hash)
+                    WHERE ri.id = r.id
+                    AND ri.relink_pending
+                    AND ri.content_hash IS NOT DISTINCT FROM r.content_hash
+                    """
+                ),
+                {"ids": list(ids), "hashes": list(hashes)},
+            )
 
+        create_snapshot_partition(conn, run_id)
+        copy_snapshot(conn, run_id, item_ids, cluster_ids)
+        attach_snapshot_partition(conn, run_id)
 
-def generate_clusters():
-    with engine.connect() as conn:
-        result = conn.execute(text(settings.similarity_query))
-        all_items = conn.execute(
-            text("SELECT id FROM raw_item")
-        ).fetchall()
+        if settings.cluster_centroids:
+            base_run_id = run.get("base_run_id")
+            chain = [run_id] + (run_chain(conn, base_run_id) if base_run_id else [])
+            create_centroid_partition(conn, run_id)
+            clusters = build_centroids(conn, run_id, chain)
+            attach_centroid_partition(conn, run_id)
+            logger.info("%d cluster centroids built", clusters)
 
-        df = pd.DataFrame(result.fetchall())
+        conn.execute(text("UPDATE cluster_run SET is_active = false WHERE is_active"))
+        conn.execute(insert(ClusterRun), [{**run, "is_active": True}])
 
-    all_item_ids = {row[0] for row in all_items}
 
-    # ===== SVM =====
-    X = np.column_stack([
-        df.sim_name,
-        df.sim_desc
-    ])
+def get_active_run(conn) -> dict | None:
+    """Return the active cluster_run record, if any."""
+    row = conn.execute(
+        text(
+            """
+            SELECT cluster_run_id, max_item_id
+            FROM cluster_run
+            WHERE is_active
+            """
+        )
+    ).first()
+    return dict(row._mapping) if row else None
 
-    svm_score = np.dot(X, settings.w_vector) + settings.bias
-    df["pred_shift"] = (svm_score > 0).astype(int)
 
-    # ===== GRAPH =====
-    edges_df = df[df["pred_shift"] == 0][["item_1_id", "item_2_id"]]
+def edge_predicate(alias: str = "pairs") -> str:
+    """
+    settings.link_model as a SQL condition over the sim_name and sim_desc
+    columns of alias; its parameters come from edge_params().
+    """
+    if settings.link_model == "svm":
+        return f"(:w_name * {alias}.sim_name + :w_desc * {alias}.sim_desc + :bias) <= 0"
+    if settings.link_model == "threshold":
+        return f"{alias}.sim_name >= :name_threshold AND {alias}.sim_desc >= :desc_threshold"
+    raise ValueError(f"Unknown link model: {settings.link_model}")
 
-    G = nx.Graph()
-    G.add_edges_from(edges_df.itertuples(index=False))
 
-    clusters = list(nx.connected_components(G))
+def edge_params() -> dict:
+    if settings.link_model == "svm":
+        w_name, w_desc = (float(w) for w in settings.w_vector)
+        return {"w_name": w_name, "w_desc": w_desc, "bias": float(settings.bias)}
+    return {
+        "name_threshold": settings.name_threshold,
+        "desc_threshold": settings.desc_threshold,
+    }
 
-    items_in_graph = set().union(*clusters) if clusters else set()
-    singleton_items = all_item_ids - items_in_graph
 
-    for item_id in singleton_items:
-        clusters.append({item_id})
+def candidate_query(
+    incremental: bool = False,
+    candidate_mode: str = "exact",
+    pushdown: bool = False,
+    sharded: bool = False,
+):
+    """
+    Candidate pairs restricted to items up to :max_item_id. Incremental queries
+    keep only pairs touching one of :new_ids, the items the previous run did
+    not see. Ids are drawn from the sequence before commit, so those can sit
+    below ids the previous run already had; :watermark, just below the lowest
+    new id, is the range bound the planner can push into the join, since
+    item_1_id < item_2_id.
 
-    # ===== SNAPSHOT ROWS =====
-    run_id = uuid.uuid4()
+    In ann mode the pairs come from settings.ann_similarity_query, whose
+    neighbour lookups start only from items in (:source_after, :source_until].
+    With pushdown the link model is applied in the query and only edges are
+    returned. A sharded exact query keeps item_1_id in (:shard_after, :shard_until].
+    """
+    base_sql = (
+        settings.ann_similarity_query
+        if candidate_mode == "ann"
+        else settings.similarity_query
+    )
+    sql = f"""
+        SELECT pairs.*
+        FROM ({base_sql}) pairs
+        WHERE pairs.item_2_id <= :max_item_id
+    """
+    if incremental:
+        sql += (
+            " AND pairs.item_2_id > :watermark"
+            " AND (pairs.item_1_id = ANY(:new_ids) OR pairs.item_2_id = ANY(:new_ids))"
+        )
+    if pushdown:
+        sql += f" AND {edge_predicate()}"
+    if sharded and candidate_mode != "ann":
+        sql += " AND pairs.item_1_id > :shard_after AND pairs.item_1_id <= :shard_until"
+    return text(sql)
 
-    rows = [
-        {
-            "created_by": "system",
-            "cluster_run_id": run_id,
-            "cluster_id": cluster_id,
-            "raw_item_id": raw_item_id
-        }
-        for cluster_id, item_ids in enumerate(clusters)
-        for raw_item_id in item_ids
+
+def candidate_params(
+    max_item_id: int,
+    new_ids: np.ndarray | None,
+    candidate_mode: str,
+    pushdown: bool = False,
+    shard: tuple[int, int] | None = None,
+) -> dict:
+    params = {"max_item_id": max_item_id}
+    if pushdown:
+        params.update(edge_params())
+    watermark = 0
+    if new_ids is not None:
+        # Nothing new: no pair has item_2_id above max_item_id
+        watermark = int(new_ids[0]) - 1 if len(new_ids) else max_item_id
+        params["watermark"] = watermark
+        params["new_ids"] = new_ids.tolist()
+    if candidate_mode == "ann":
+        params["ann_top_k"] = settings.ann_top_k
+        params["source_after"] = watermark
+        params["source_until"] = max_item_id
+        if shard is not None:
+            params["source_after"], params["source_until"] = shard
+    elif shard is not None:
+        params["shard_after"], params["shard_until"] = shard
+    return params
+
+
+def shard_bounds(source_ids: np.ndarray, shard_count: int) -> list[tuple[int, int]]:
+    """
+    Split sorted source ids into contiguous (after, until] ranges holding
+    about the same number of items. Ranges are disjoint, so no pair is
+    scored twice and none is lost.
+    """
+    return [
+        (int(chunk[0]) - 1, int(chunk[-1]))
+        for chunk in np.array_split(source_ids, shard_count)
+        if len(chunk)
     ]
 
-    return rows
 
-def link_job():
-    rows = generate_clusters()
-    persist_clusters_bulk_engine(engine, rows)
+def set_ann_search_params(conn):
+    """Widen the HNSW candidate list for the current transaction."""
+    conn.execute(
+        text("SELECT set_config('hnsw.ef_search', :ef_search, true)"),
+        {"ef_search": str(max(settings.ann_ef_search, settings.ann_top_k))},
+    )
+
+
+def sample_recall_items(conn, max_item_id: int, new_ids: np.ndarray | None) -> np.ndarray:
+    """Random sample of the items scored in this run, used to measure ann recall."""
+    if settings.ann_recall_sample <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if new_ids is not None:
+        size = min(settings.ann_recall_sample, len(new_ids))
+        return np.random.default_rng().choice(new_ids, size, replace=False)
+
+    rows = conn.execute(
+        text(
+            """
+            SELECT id
+            FROM raw_item
+            WHERE id <= :max_item_id
+            ORDER BY random()
+            LIMIT :sample_size
+            """
+        ),
+        {
+            "max_item_id": max_item_id,
+            "sample_size": settings.ann_recall_sample,
+        },
+    ).fetchall()
+    return np.array([row[0] for row in rows], dtype=np.int64)
+
+
+def estimate_candidate_recall(
+    conn,
+    found_pairs: set[tuple[int, int]],
+    sample_ids: np.ndarray,
+    max_item_id: int,
+) -> float | None:
+    """
+    Compare the ann edges touching sample_ids against the linking pairs of the
+    exhaustive join for those items. Returns None when there is nothing to compare.
+    """
+    if len(sample_ids) == 0:
+        return None
+
+    sql = f"""
+        SELECT pairs.item_1_id, pairs.item_2_id
+        FROM ({settings.exact_sample_query}) pairs
+        WHERE {edge_predicate()}
+    """
+    exact = {
+        (row.item_1_id, row.item_2_id)
+        for row in conn.execute(
+            text(sql),
+            {"sample_ids": sample_ids.tolist(), "max_item_id": max_item_id, **edge_params()},
+        ).fetchall()
+    }
+    if not exact:
+        return None
+
+    return len(exact & found_pairs) / len(exact)
+
+
+def score_pairs(chunk: np.ndarray) -> np.ndarray:
+    """
+    settings.link_model over the (sim_name, sim_desc) columns of a candidate
+    chunk; returns the mask of linking pairs. Matches edge_predicate(), with
+    NULL similarities never linking.
+    """
+    if settings.link_model == "svm":
+        svm_score = chunk[:, 2:4] @ settings.w_vector + settings.bias
+        return svm_score <= 0
+    if settings.link_model == "threshold":
+        return (chunk[:, 2] >= settings.name_threshold) & (chunk[:, 3] >= settings.desc_threshold)
+    raise ValueError(f"Unknown link model: {settings.link_model}")
+
+
+def stream_edges(
+    conn,
+    query,
+    params: dict,
+    on_edges: Callable[[np.ndarray], None],
+    sample_ids: np.ndarray,
+    pushdown: bool = False,
+):
+    """
+    Fetch candidate pairs through a server-side cursor in chunks of
+    settings.link_chunk_size rows and hand the edges of each chunk to
+    on_edges. With pushdown the query already returns only edges.
+
+    Returns (pairs fetched, edge count, edges touching sample_ids).
+    """
+    result = conn.execution_options(
+        stream_results=True,
+        max_row_buffer=settings.link_chunk_size,
+    ).execute(query, params)
+
+    sampled_pairs: set[tuple[int, int]] = set()
+    candidate_pairs = 0
+    edge_count = 0
+
+    for rows in result.partitions(settings.link_chunk_size):
+        chunk = np.array(rows, dtype=np.float64)
+        candidate_pairs += len(chunk)
+
+        ids = chunk[:, :2].astype(np.int64)
+        edges = ids if pushdown else ids[score_pairs(chunk)]
+        edge_count += len(edges)
+        on_edges(edges)
+
+        if len(sample_ids):
+            touching = np.isin(edges[:, 0], sample_ids) | np.isin(edges[:, 1], sample_ids)
+            sampled_pairs.update(map(tuple, edges[touching].tolist()))
+
+    return candidate_pairs, edge_count, sampled_pairs
+
+
+def score_shard(
+    snapshot_id: str,
+    shard: tuple[int, int],
+    max_item_id: int,
+    new_ids: np.ndarray | None,
+    candidate_mode: str,
+    pushdown: bool,
+    sample_ids: np.ndarray,
+):
+    """
+    Worker entry point: score one shard inside the coordinator's exported
+    snapshot and return the shard's spanning forest, which is far smaller
+    than its edge list, with the same counters as stream_edges.
+    """
+    edge_chunks = [np.empty((0, 2), dtype=np.int64)]
+
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        # Must be the first statement of the transaction; the id comes from pg_export_snapshot()
+        conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+        if conn.dialect.server_version_info >= (14,):
+            # A killed worker's backend stops its query instead of running it to the end
+            conn.execute(text("SET LOCAL client_connection_check_interval = '1s'"))
+        if candidate_mode == "ann":
+            set_ann_search_params(conn)
+
+        candidate_pairs, edge_count, sampled_pairs = stream_edges(
+            conn,
+            candidate_query(new_ids is not None, candidate_mode, pushdown, sharded=True),
+            candidate_params(max_item_id, new_ids, candidate_mode, pushdown, shard),
+            edge_chunks.append,
+            sample_ids,
+            pushdown,
+        )
+
+    edges = np.concatenate(edge_chunks)
+    components = ArrayUnionFind(edges.ravel())
+    components.union(edges)
+
+    return components.forest(), candidate_pairs, edge_count, sampled_pairs
+
+
+def terminate_pool(pool: ProcessPoolExecutor):
+    """Drop queued shards and kill the workers, whose connections roll back with them."""
+    # shutdown() forgets the worker processes, so take them first
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def stream_edges_parallel(
+    conn,
+    components: ArrayUnionFind,
+    max_item_id: int,
+    new_ids: np.ndarray | None,
+    candidate_mode: str,
+    pushdown: bool,
+    sample_ids: np.ndarray,
+    progress: LinkProgress,
+):
+    """
+    Score id-range shards in a pool of settings.link_workers processes, all
+    reading the snapshot of conn's transaction, and merge each shard's forest
+    into components as it completes.
+
+    Exact mode shards item_1_id, so each candidate pair belongs to one shard.
+    Ann mode shards the items whose neighbours are looked up, and a pair
+    found from both of its ends in two shards is returned by both: the union
+    is unaffected, but candidate_pairs and edge_count count such pairs twice.
+    """
+    source_ids = components.item_ids
+    if candidate_mode == "ann" and new_ids is not None:
+        source_ids = new_ids
+
+    shards = shard_bounds(source_ids, settings.link_workers * settings.link_shards_per_worker)
+    snapshot_id = conn.execute(text("SELECT pg_export_snapshot()")).scalar_one()
+
+    sampled_pairs: set[tuple[int, int]] = set()
+    candidate_pairs = 0
+    edge_count = 0
+
+    with ProcessPoolExecutor(max_workers=settings.link_workers, mp_context=_mp) as pool:
+        futures = [
+            pool.submit(
+                score_shard,
+                snapshot_id,
+                shard,
+                max_item_id,
+                new_ids,
+                candidate_mode,
+                pushdown,
+                sample_ids,
+            )
+            for shard in shards
+        ]
+        try:
+            pending = set(futures)
+            while pending:
+                # Wakes up every second, so a cancel does not wait for a long shard
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    forest, shard_pairs, shard_edges, shard_sampled = future.result()
+                    components.union(forest)
+                    candidate_pairs += shard_pairs
+                    edge_count += shard_edges
+                    sampled_pairs |= shard_sampled
+                progress.check_cancelled()
+        except BaseException:
+            # Cancelled, failed or terminated: leaving the block would wait for running shards
+            terminate_pool(pool)
+            raise
+
+    return candidate_pairs, edge_count, sampled_pairs
+
+
+def generate_clusters(
+    mode: str | None = None,
+    candidate_mode: str | None = None,
+    progress: LinkProgress | None = None,
+):
+    """
+    Build cluster snapshot rows. In incremental mode only pairs involving items
+    missing from the last run's snapshot are scored and merged into that run's components,
+    which yields the same partition as a full rebuild.
+
+    Returns (run record, item ids, cluster ids, relinked); with delta storage
+    only the items whose cluster changed since the active run are returned.
+    relinked lists the (id, content_hash) of updated rows the run has seen.
+    """
+    progress = progress or LinkProgress()
+
+    mode = mode or settings.link_mode
+    if mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {mode}")
+
+    candidate_mode = candidate_mode or settings.candidate_mode
+    if candidate_mode not in CANDIDATE_MODES:
+        raise ValueError(f"Unknown candidate mode: {candidate_mode}")
+
+    if settings.link_model not in LINK_MODELS:
+        raise ValueError(f"Unknown link model: {settings.link_model}")
+
+    if settings.snapshot_storage not in SNAPSHOT_STORAGES:
+        raise ValueError(f"Unknown snapshot storage: {settings.snapshot_storage}")
+
+    pushdown = settings.score_pushdown
+
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with progress.stage("candidates"):
+            max_item_id = conn.execute(
+                text("SELECT COALESCE(MAX(id), 0) FROM raw_item")
+            ).scalar_one()
+
+            active = get_active_run(conn)
+            previous = active if mode == "incremental" else None
+
+            # Upserted rows keep their id, so the prior snapshot cannot tell
+            # them apart. The flag only becomes visible when the upsert commits,
+            # unlike its updated_at, and stays set until a run has read the change
+            relinked = [
+                tuple(row)
+                for row in conn.execute(
+                    text("SELECT id, content_hash FROM raw_item WHERE relink_pending")
+                ).fetchall()
+            ]
+            if previous and relinked:
+                logger.info("%d items updated since the active run, linking in full", len(relinked))
+                previous = None
+
+            if previous is None:
+                mode = "full"
+
+            # Delta storage diffs against the active run until its chain gets too long
+            base = active
+            if settings.snapshot_storage == "full" or (
+                active and len(run_chain(conn, active["cluster_run_id"])) >= settings.snapshot_max_delta_chain
+            ):
+                base = None
+
+            if previous or base:
+                prior_item_ids, prior_cluster_ids = load_snapshot(conn, active["cluster_run_id"])
+
+            all_item_ids = np.array(
+                conn.execute(
+                    text("SELECT id FROM raw_item WHERE id <= :max_item_id ORDER BY id"),
+                    {"max_item_id": max_item_id},
+                ).scalars().all(),
+                dtype=np.int64,
+            )
+            components = ArrayUnionFind(all_item_ids)
+
+            # Previous clusters are merged in, so new edges extend them. New
+            # items are those the previous run did not see, not ids above its
+            # max_item_id: a lower id may commit after the run started
+            new_ids = None
+            if previous:
+                components.union_groups(prior_cluster_ids, prior_item_ids)
+                new_ids = np.setdiff1d(all_item_ids, prior_item_ids, assume_unique=True)
+
+            if candidate_mode == "ann":
+                set_ann_search_params(conn)
+                sample_ids = sample_recall_items(conn, max_item_id, new_ids)
+            else:
+                sample_ids = np.empty(0, dtype=np.int64)
+
+        # ===== SVM =====
+        # Candidate pairs are scored in the query (pushdown) or per streamed
+        # chunk; surviving edges go straight into the union-find
+        with progress.stage("scoring"):
+            if settings.link_workers > 1:
+                candidate_pairs, edge_count, sampled_pairs = stream_edges_parallel(
+                    conn,
+                    components,
+                    max_item_id,
+                    new_ids,
+                    candidate_mode,
+                    pushdown,
+                    sample_ids,
+                    progress,
+                )
+            else:
+                candidate_pairs, edge_count, sampled_pairs = stream_edges(
+                    conn,
+                    candidate_query(new_ids is not None, candidate_mode, pushdown),
+                    candidate_params(max_item_id, new_ids, candidate_mode, pushdown),
+                    components.union,
+                    sample_ids,
+                    pushdown,
+                )
+
+            candidate_recall = estimate_candidate_recall(conn, sampled_pairs, sample_ids, max_item_id)
+
+    if candidate_recall is not None:
+        logger.info("ann candidate recall %.4f over %d pairs", candidate_recall, candidate_pairs)
+
+    if not pushdown:
+        logger.info("%d edges from %d candidate pairs", edge_count, candidate_pairs)
+
+    # ===== CLUSTERS =====
+    # Each cluster is labelled by its smallest item id; items without edges
+    # are their own cluster
+    with progress.stage("graph"):
+        cluster_ids = components.labels()
+        cluster_count = int(np.count_nonzero(cluster_ids == components.item_ids))
+
+        # ===== SNAPSHOT ROWS =====
+        run_id = uuid.uuid4()
+        item_ids = components.item_ids
+
+        if base:
+            changed = changed_rows(item_ids, cluster_ids, prior_item_ids, prior_cluster_ids)
+            item_ids, cluster_ids = item_ids[changed], cluster_ids[changed]
+
+    run = {
+        "created_by": "system",
+        "cluster_run_id": run_id,
+        "mode": mode,
+        "max_item_id": max_item_id,
+        "item_count": len(components),
+        "cluster_count": cluster_count,
+        "candidate_mode": candidate_mode,
+        "candidate_pairs": candidate_pairs,
+        "candidate_recall": candidate_recall,
+        "edge_count": edge_count,
+        "storage": "delta" if base else "full",
+        "base_run_id": base["cluster_run_id"] if base else None,
+        "snapshot_rows": len(item_ids),
+    }
+
+    return run, item_ids, cluster_ids, relinked
+
+
+@contextmanager
+def link_lock():
+    """Hold the link advisory lock on a dedicated connection, failing fast if taken."""
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": LINK_LOCK_KEY}).scalar_one():
+            raise LinkJobBusy("Another link run is active")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LINK_LOCK_KEY})
+
+
+def link_job(
+    mode: str | None = None,
+    candidate_mode: str | None = None,
+    progress: LinkProgress | None = None,
+):
+    """
+    Run one link job. The snapshot rows and the cluster_run record are written
+    in a single transaction, so a failed or cancelled run leaves no trace.
+    """
+    progress = progress or LinkProgress()
+    with link_lock():
+        run, item_ids, cluster_ids, relinked = generate_clusters(mode, candidate_mode, progress)
+        with progress.stage("persist"):
+            persist_clusters_bulk_engine(engine, run, item_ids, cluster_ids, relinked)
+    return run
 
 
 if __name__ == '__main__':
-    rows = generate_clusters()
-    persist_clusters_bulk_engine(engine, rows)
\ No newline at end of file
+    import sys
+
+    link_job(sys.argv[1] if len(sys.argv) > 1 else None)
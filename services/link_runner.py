@@ -0,0 +1,388 @@
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlmodel import text
+
+from core.config import settings
+from core.database import engine
+from core.metrics import (
+    LINK_CANDIDATE_PAIRS,
+    LINK_CLUSTERS,
+    LINK_EDGES,
+    LINK_ITEMS,
+    LINK_JOBS,
+    LINK_STAGE_SECONDS,
+    log_timing,
+)
+from schemas.link_job import LinkJobStage, LinkJobStatus, LinkRunSummary
+from services.cluster_cache import cluster_cache
+from services.link_job import LINK_STAGES, LinkJobCancelled, LinkProgress, link_job
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+_mp = multiprocessing.get_context("spawn")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class QueueProgress(LinkProgress):
+    """Forwards stage events from the link process to the runner through a queue."""
+
+    def __init__(self, events, cancel_event):
+        self.events = events
+        self.cancel_event = cancel_event
+
+    @contextmanager
+    def stage(self, name: str):
+        self.check_cancelled()
+        self.events.put(("stage_started", name, _now()))
+        yield
+        self.events.put(("stage_finished", name, _now()))
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise LinkJobCancelled()
+
+
+def _exit_on_sigterm(signum, frame):
+    # Unwinds like a cancel, so stream_edges_parallel kills its shard workers first
+    raise SystemExit(128 + signum)
+
+
+def _run_link_process(events, cancel_event, mode, candidate_mode):
+    """Entry point of the link process; reports the outcome as the last event."""
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        run = link_job(mode, candidate_mode, QueueProgress(events, cancel_event))
+        events.put(("succeeded", run, _now()))
+    except LinkJobCancelled:
+        events.put(("cancelled", None, _now()))
+    except Exception as exc:
+        events.put(("failed", f"{type(exc).__name__}: {exc}", _now()))
+
+
+JOB_COLUMNS = "job_id, status, mode, candidate_mode, created_at, started_at, finished_at, stages, run, error"
+
+# pg advisory lock key serialising claims, so one job runs at a time across API workers
+CLAIM_LOCK_KEY = 726_100_002
+
+CLAIM_SQL = f"""
+    UPDATE link_job
+    SET status = 'running', started_at = :now, heartbeat_at = :now
+    WHERE job_id = (
+        SELECT job_id
+        FROM link_job
+        WHERE status = 'queued'
+        AND NOT EXISTS (SELECT 1 FROM link_job WHERE status IN ('running', 'cancelling'))
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING {JOB_COLUMNS}
+"""
+
+# Jobs whose worker died (restart, crash) without finishing them
+FAIL_STALE_SQL = """
+    UPDATE link_job
+    SET status = 'failed', error = 'Link runner stopped responding', finished_at = :now
+    WHERE status IN ('running', 'cancelling')
+    AND heartbeat_at < :now - make_interval(secs => :stale_seconds)
+"""
+
+
+def _job_status(row) -> LinkJobStatus:
+    return LinkJobStatus.model_validate(dict(row._mapping))
+
+
+class LinkJobRunner:
+    """
+    Runs link jobs from the link_job table one at a time across API workers,
+    each in its own process so that CPU-bound clustering stays off the API
+    process and a cancelled run can be stopped outright. Status, stages and
+    cancel requests go through the table, so any worker can answer for or
+    cancel any job and history survives restarts. Nothing is committed unless
+    the job succeeds.
+    """
+
+    def __init__(self, history: int, poll_seconds: float):
+        self.history = history
+        self.poll_seconds = poll_seconds
+        self._running: tuple[uuid.UUID, object] | None = None
+        self._process = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: threading.Thread | None = None
+        self._stopping = False
+
+    def start(self):
+        """Start polling for queued jobs, including ones queued through other workers."""
+        with self._lock:
+            self._ensure_worker()
+
+    def submit(self, mode: str | None = None, candidate_mode: str | None = None) -> LinkJobStatus:
+        job = LinkJobStatus(
+            job_id=uuid.uuid4(),
+            mode=mode,
+            candidate_mode=candidate_mode,
+            created_at=_now(),
+            stages=[LinkJobStage(name=name) for name in LINK_STAGES],
+        )
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO link_job (job_id, status, mode, candidate_mode, created_at, stages, cancel_requested)
+                    VALUES (:job_id, :status, :mode, :candidate_mode, :created_at, CAST(:stages AS jsonb), false)
+                    """
+                ),
+                {
+                    **job.model_dump(include={"job_id", "status", "mode", "candidate_mode", "created_at"}),
+                    "stages": self._stages_json(job),
+                },
+            )
+        with self._lock:
+            self._ensure_worker()
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id: uuid.UUID) -> LinkJobStatus | None:
+        with engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT {JOB_COLUMNS} FROM link_job WHERE job_id = :job_id"), {"job_id": job_id}
+            ).first()
+        return _job_status(row) if row else None
+
+    def list(self) -> list[LinkJobStatus]:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT {JOB_COLUMNS} FROM link_job ORDER BY created_at DESC LIMIT :history"),
+                {"history": self.history},
+            ).fetchall()
+        return [_job_status(row) for row in rows]
+
+    def cancel(self, job_id: uuid.UUID) -> LinkJobStatus | None:
+        """Drop a queued job, or ask a running one to stop at its next stage boundary."""
+        with engine.begin() as conn:
+            row = conn.execute(
+                text(
+                    f"""
+                    UPDATE link_job
+                    SET status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE 'cancelling' END,
+                        finished_at = CASE WHEN status = 'queued' THEN :now ELSE finished_at END,
+                        cancel_requested = status <> 'queued'
+                    WHERE job_id = :job_id AND status IN ('queued', 'running', 'cancelling')
+                    RETURNING {JOB_COLUMNS}
+                    """
+                ),
+                {"job_id": job_id, "now": _now()},
+            ).first()
+        if row is None:
+            return self.get(job_id)
+
+        # A job running in this process stops without waiting for the next poll
+        with self._lock:
+            if self._running is not None and self._running[0] == job_id:
+                self._running[1].set()
+        return _job_status(row)
+
+    def shutdown(self):
+        with self._lock:
+            self._stopping = True
+            process = self._process
+        self._wakeup.set()
+        if process is not None and process.is_alive():
+            process.terminate()
+
+    def _trim_history(self, conn):
+        conn.execute(
+            text(
+                """
+                DELETE FROM link_job
+                WHERE status IN ('succeeded', 'failed', 'cancelled')
+                AND job_id NOT IN (SELECT job_id FROM link_job ORDER BY created_at DESC LIMIT :history)
+                """
+            ),
+            {"history": self.history},
+        )
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="link-runner", daemon=True)
+            self._worker.start()
+
+    def _claim(self) -> LinkJobStatus | None:
+        with engine.begin() as conn:
+            now = _now()
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY})
+            conn.execute(text(FAIL_STALE_SQL), {"now": now, "stale_seconds": settings.link_job_stale_seconds})
+            row = conn.execute(text(CLAIM_SQL), {"now": now}).first()
+        return _job_status(row) if row else None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+
+            # Cleared before claiming, so a job submitted meanwhile is not missed
+            self._wakeup.clear()
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception("link job runner could not poll link_job")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_seconds)
+                continue
+
+            cancel_event = _mp.Event()
+            with self._lock:
+                self._running = (job.job_id, cancel_event)
+
+            try:
+                self._run(job, cancel_event)
+            except Exception as exc:
+                logger.exception("link job %s crashed", job.job_id)
+                self._finish(job, "failed", error=str(exc))
+            finally:
+                with self._lock:
+                    self._running = None
+                    self._process = None
+
+    def _heartbeat(self, job: LinkJobStatus) -> bool:
+        """Touch the job's heartbeat; True once any worker asked to cancel it."""
+        with engine.begin() as conn:
+            return bool(
+                conn.execute(
+                    text("UPDATE link_job SET heartbeat_at = :now WHERE job_id = :job_id RETURNING cancel_requested"),
+                    {"job_id": job.job_id, "now": _now()},
+                ).scalar()
+            )
+
+    def _run(self, job: LinkJobStatus, cancel_event):
+        events = _mp.Queue()
+        process = _mp.Process(
+            target=_run_link_process,
+            args=(events, cancel_event, job.mode, job.candidate_mode),
+            name=f"link-job-{job.job_id}",
+        )
+        with self._lock:
+            self._process = process
+        process.start()
+
+        cancel_requested_at = None
+        while True:
+            if not cancel_event.is_set() and self._heartbeat(job):
+                cancel_event.set()
+
+            try:
+                kind, payload, at = events.get(timeout=1.0)
+            except queue.Empty:
+                if cancel_event.is_set():
+                    cancel_requested_at = cancel_requested_at or _now()
+                    waited = (_now() - cancel_requested_at).total_seconds()
+                    if waited > settings.link_cancel_grace_seconds and process.is_alive():
+                        # Killing the process drops its connection, rolling back the open transaction
+                        process.terminate()
+                if not process.is_alive() and events.empty():
+                    process.join()
+                    if cancel_event.is_set():
+                        self._finish(job, "cancelled")
+                    else:
+                        self._finish(job, "failed", error=f"Link process exited with code {process.exitcode}")
+                    return
+                continue
+
+            if kind in ("stage_started", "stage_finished"):
+                self._update_stage(job, kind, payload, at)
+            elif kind == "succeeded":
+                self._finish(job, "succeeded", run=LinkRunSummary(**payload), at=at)
+                cluster_cache.invalidate()
+            else:
+                self._finish(job, kind, error=payload, at=at)
+
+            if kind in TERMINAL_STATUSES:
+                process.join()
+                return
+
+    @staticmethod
+    def _stages_json(job: LinkJobStatus) -> str:
+        return json.dumps([stage.model_dump(mode="json") for stage in job.stages])
+
+    def _update_stage(self, job: LinkJobStatus, kind: str, name: str, at: datetime):
+        stage = next(s for s in job.stages if s.name == name)
+        if kind == "stage_started":
+            stage.status = "running"
+            stage.started_at = at
+        else:
+            stage.status = "done"
+            stage.finished_at = at
+            stage.seconds = (at - stage.started_at).total_seconds()
+            LINK_STAGE_SECONDS.observe(stage.seconds, stage=name)
+
+        with engine.begin() as conn:
+            conn.execute(
+                text("UPDATE link_job SET stages = CAST(:stages AS jsonb), heartbeat_at = :now WHERE job_id = :job_id"),
+                {"job_id": job.job_id, "stages": self._stages_json(job), "now": _now()},
+            )
+
+    def _finish(self, job: LinkJobStatus, status: str, run=None, error=None, at=None):
+        job.status = status
+        job.run = run
+        job.error = error
+        job.finished_at = at or _now()
+        for stage in job.stages:
+            if stage.status == "running":
+                stage.status = "cancelled" if status == "cancelled" else "failed"
+
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    """
+                    UPDATE link_job
+                    SET status = :status, stages = CAST(:stages AS jsonb), run = CAST(:run AS jsonb),
+                        error = :error, finished_at = :finished_at
+                    WHERE job_id = :job_id
+                    """
+                ),
+                {
+                    "job_id": job.job_id,
+                    "status": status,
+                    "stages": self._stages_json(job),
+                    "run": run.model_dump_json() if run is not None else None,
+                    "error": error,
+                    "finished_at": job.finished_at,
+                },
+            )
+            self._trim_history(conn)
+        logger.info("link job %s %s", job.job_id, status)
+
+        LINK_JOBS.inc(status=status)
+        if run is not None:
+            LINK_CANDIDATE_PAIRS.set(run.candidate_pairs)
+            LINK_EDGES.set(run.edge_count)
+            LINK_CLUSTERS.set(run.cluster_count)
+            LINK_ITEMS.set(run.item_count)
+        log_timing(
+            "link_job",
+            job_id=job.job_id,
+            status=status,
+            seconds=(job.finished_at - job.started_at).total_seconds() if job.started_at else None,
+            stages={stage.name: stage.seconds for stage in job.stages if stage.seconds is not None},
+            run=run.model_dump(mode="json") if run is not None else None,
+        )
+
+
+link_runner = LinkJobRunner(settings.link_job_history, settings.link_job_poll_seconds)
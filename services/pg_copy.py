@@ -0,0 +1,135 @@
+"""Helpers for streaming rows into PostgreSQL COPY, in CSV or binary format."""
+import io
+import struct
+import uuid
+from decimal import Decimal
+from typing import Iterator
+
+import numpy as np
+
+
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+BINARY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+
+NUMERIC_POS = 0x0000
+NUMERIC_NEG = 0x4000
+
+
+class IteratorStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, consumed lazily by COPY."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def encode_text(value) -> bytes:
+    """text/varchar field; None and empty strings become NULL like in CSV COPY."""
+    if value is None or value == "":
+        return NULL_FIELD
+    data = str(value).encode("utf-8")
+    return struct.pack(">i", len(data)) + data
+
+
+def encode_int4(value) -> bytes:
+    """integer field; fractional values are rejected like in CSV COPY, not truncated."""
+    if value is None or value == "":
+        return NULL_FIELD
+    number = Decimal(value)
+    if number != number.to_integral_value():
+        raise ValueError(f"Cannot encode {value!r} as integer")
+    return struct.pack(">ii", 4, int(number))
+
+
+def encode_int8(value) -> bytes:
+    if value is None:
+        return NULL_FIELD
+    return struct.pack(">iq", 8, int(value))
+
+
+def encode_uuid(value: uuid.UUID) -> bytes:
+    return struct.pack(">i", 16) + value.bytes
+
+
+def encode_numeric(value) -> bytes:
+    """numeric field in PostgreSQL's base-10000 binary representation."""
+    if value is None or value == "":
+        return NULL_FIELD
+
+    sign, digits, exponent = Decimal(value).as_tuple()
+    if not isinstance(exponent, int):
+        raise ValueError(f"Cannot encode {value!r} as numeric")
+
+    dscale = max(-exponent, 0)
+    digit_str = "".join(map(str, digits))
+    if exponent > 0:
+        digit_str += "0" * exponent
+        exponent = 0
+
+    split = len(digit_str) + exponent
+    if split < 0:
+        int_part, frac_part = "", "0" * -split + digit_str
+    else:
+        int_part, frac_part = digit_str[:split], digit_str[split:]
+
+    int_part = int_part.zfill(-(-len(int_part) // 4) * 4)
+    frac_part = frac_part.ljust(-(-len(frac_part) // 4) * 4, "0")
+
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    payload = struct.pack(
+        f">hhHH{len(groups)}h",
+        len(groups),
+        weight,
+        NUMERIC_NEG if sign and groups else NUMERIC_POS,
+        dscale,
+        *groups,
+    )
+    return struct.pack(">i", len(payload)) + payload
+
+
+def encode_vectors(embeddings: np.ndarray, storage: str = "vector") -> list[bytes]:
+    """
+    pgvector's binary format for each row of a 2-D array: int16 dimension,
+    int16 unused, then big-endian float32 (vector) or float16 (halfvec) values.
+    """
+    n, dim = embeddings.shape
+    dtype = ">f2" if storage == "halfvec" else ">f4"
+    item_size = np.dtype(dtype).itemsize
+    prefix = struct.pack(">ihh", 4 + item_size * dim, dim, 0)
+    data = np.ascontiguousarray(embeddings, dtype=dtype)
+    return [prefix + row.tobytes() for row in data]
+
+
+def encode_vector_text(embedding: np.ndarray) -> str:
+    """pgvector's text format, with enough digits to round-trip float32."""
+    return "[" + ",".join(format(x, ".9g") for x in embedding.tolist()) + "]"
+
+
+def encode_tuple(fields: list[bytes]) -> bytes:
+    return struct.pack(">h", len(fields)) + b"".join(fields)
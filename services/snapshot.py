@@ -0,0 +1,249 @@
+"""
+Cluster snapshot storage. A run is stored either in full or as a delta: only
+the items whose cluster changed since its base run. Readers go through the
+resolved view, which walks the base_run_id chain and takes each item's row
+from the nearest run.
+
+item_cluster_snapshot is list-partitioned by cluster_run_id. Each run's rows
+are copied into a standalone table that is attached as the run's partition,
+and dropping a run drops its partition.
+"""
+import uuid
+from typing import Iterator
+
+import numpy as np
+from sqlmodel import text
+
+from services.pg_copy import BINARY_HEADER, BINARY_TRAILER, IteratorStream
+
+
+SNAPSHOT_STORAGES = ("full", "delta")
+SNAPSHOT_COPY_CHUNK = 100_000
+SNAPSHOT_CREATED_BY = b"system"
+
+# The run followed by its base runs, nearest first
+RUN_CHAIN_SQL = """
+    WITH RECURSIVE chain AS (
+        SELECT cluster_run_id, base_run_id, 0 AS depth
+        FROM cluster_run
+        WHERE cluster_run_id = :run_id
+        UNION ALL
+        SELECT r.cluster_run_id, r.base_run_id, chain.depth + 1
+        FROM cluster_run r
+        JOIN chain ON r.cluster_run_id = chain.base_run_id
+    )
+    SELECT cluster_run_id FROM chain ORDER BY depth
+"""
+
+# resolved: raw_item_id -> cluster_id as seen by the first run of :chain. The
+# chain is bound as an array so only its partitions are scanned.
+RESOLVED_SNAPSHOT_CTE = """
+    WITH resolved AS (
+        SELECT DISTINCT ON (raw_item_id) raw_item_id, cluster_id
+        FROM item_cluster_snapshot
+        WHERE cluster_run_id = ANY(CAST(:chain AS uuid[]))
+        ORDER BY raw_item_id, array_position(CAST(:chain AS uuid[]), cluster_run_id)
+    )
+"""
+
+# One binary COPY tuple per row: created_by, cluster_run_id, cluster_id, raw_item_id.
+# Every field has a fixed width, so rows are packed with a structured array.
+SNAPSHOT_COPY_COLUMNS = ("created_by", "cluster_run_id", "cluster_id", "raw_item_id")
+_SNAPSHOT_TUPLE = np.dtype([
+    ("field_count", ">i2"),
+    ("created_by_len", ">i4"),
+    ("created_by", f"S{len(SNAPSHOT_CREATED_BY)}"),
+    ("run_len", ">i4"),
+    ("run", "S16"),
+    ("cluster_len", ">i4"),
+    ("cluster", ">i4"),
+    ("item_len", ">i4"),
+    ("item", ">i4"),
+])
+
+
+def snapshot_partition(run_id: uuid.UUID) -> str:
+    return f"item_cluster_snapshot_{run_id.hex}"
+
+
+def centroid_partition(run_id: uuid.UUID) -> str:
+    """The run's item_cluster partition (see services/cluster_centroids.py)."""
+    return f"item_cluster_{run_id.hex}"
+
+
+def create_snapshot_partition(conn, run_id: uuid.UUID):
+    """
+    Standalone table shaped like item_cluster_snapshot, to be filled and then
+    attached. Indexes are left to the attach, so they are built after the load.
+    """
+    conn.execute(
+        text(
+            f"""
+            CREATE TABLE {snapshot_partition(run_id)}
+            (LIKE item_cluster_snapshot INCLUDING DEFAULTS)
+            """
+        )
+    )
+
+
+def attach_snapshot_partition(conn, run_id: uuid.UUID):
+    # Only takes SHARE UPDATE EXCLUSIVE on the parent, so readers are not blocked
+    conn.execute(
+        text(
+            f"""
+            ALTER TABLE item_cluster_snapshot
+            ATTACH PARTITION {snapshot_partition(run_id)}
+            FOR VALUES IN ('{run_id}')
+            """
+        )
+    )
+
+
+def drop_snapshot_partition(conn, run_id: uuid.UUID):
+    conn.execute(
+        text(f"ALTER TABLE item_cluster_snapshot DETACH PARTITION {snapshot_partition(run_id)}")
+    )
+    conn.execute(text(f"DROP TABLE {snapshot_partition(run_id)}"))
+
+
+def run_chain(conn, run_id: uuid.UUID) -> list[uuid.UUID]:
+    """The run followed by its base runs, nearest first."""
+    rows = conn.execute(text(RUN_CHAIN_SQL), {"run_id": run_id}).scalars().all()
+    return list(rows)
+
+
+def load_snapshot(conn, run_id: uuid.UUID) -> tuple[np.ndarray, np.ndarray]:
+    """Resolved (item_ids, cluster_ids) of a run, sorted by item id."""
+    pairs = np.array(
+        conn.execute(
+            text(f"{RESOLVED_SNAPSHOT_CTE} SELECT raw_item_id, cluster_id FROM resolved"),
+            {"chain": run_chain(conn, run_id)},
+        ).fetchall(),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def changed_rows(
+    item_ids: np.ndarray,
+    cluster_ids: np.ndarray,
+    base_item_ids: np.ndarray,
+    base_cluster_ids: np.ndarray,
+) -> np.ndarray:
+    """Mask of items that are new or sit in a different cluster than in the base run."""
+    if len(base_item_ids) == 0:
+        return np.ones(len(item_ids), dtype=bool)
+
+    pos = np.searchsorted(base_item_ids, item_ids).clip(max=len(base_item_ids) - 1)
+    known = base_item_ids[pos] == item_ids
+    return ~known | (base_cluster_ids[pos] != cluster_ids)
+
+
+def iter_snapshot_copy(run_id: uuid.UUID, item_ids: np.ndarray, cluster_ids: np.ndarray) -> Iterator[bytes]:
+    """Binary COPY stream of a run's snapshot rows."""
+    yield BINARY_HEADER
+    for start in range(0, len(item_ids), SNAPSHOT_COPY_CHUNK):
+        stop = start + SNAPSHOT_COPY_CHUNK
+        rows = np.empty(len(item_ids[start:stop]), dtype=_SNAPSHOT_TUPLE)
+        rows["field_count"] = len(SNAPSHOT_COPY_COLUMNS)
+        rows["created_by_len"] = len(SNAPSHOT_CREATED_BY)
+        rows["created_by"] = SNAPSHOT_CREATED_BY
+        rows["run_len"] = 16
+        rows["run"] = run_id.bytes
+        rows["cluster_len"] = 4
+        rows["cluster"] = cluster_ids[start:stop]
+        rows["item_len"] = 4
+        rows["item"] = item_ids[start:stop]
+        yield rows.tobytes()
+    yield BINARY_TRAILER
+
+
+def copy_snapshot(conn, run_id: uuid.UUID, item_ids: np.ndarray, cluster_ids: np.ndarray):
+    """
+    COPY snapshot rows into the run's partition table inside conn's
+    transaction. The table must have been created or truncated in that
+    transaction, which lets COPY write the rows already frozen.
+    """
+    if len(item_ids) == 0:
+        return
+
+    cursor = conn.connection.cursor()
+    cursor.copy_expert(
+        f"""
+        COPY {snapshot_partition(run_id)} ({", ".join(SNAPSHOT_COPY_COLUMNS)})
+        FROM STDIN
+        WITH (FORMAT BINARY, FREEZE)
+        """,
+        IteratorStream(iter_snapshot_copy(run_id, item_ids, cluster_ids)),
+    )
+
+
+def compact_run(conn, run_id: uuid.UUID) -> int:
+    """
+    Rewrite a delta run as a full snapshot. Its resolved view is unchanged, so
+    deltas built on it keep resolving the same way. Returns the rows written.
+    """
+    item_ids, cluster_ids = load_snapshot(conn, run_id)
+
+    conn.execute(text(f"TRUNCATE {snapshot_partition(run_id)}"))
+    copy_snapshot(conn, run_id, item_ids, cluster_ids)
+    conn.execute(
+        text(
+            """
+            UPDATE cluster_run
+            SET storage = 'full', base_run_id = NULL, snapshot_rows = :rows
+            WHERE cluster_run_id = :run_id
+            """
+        ),
+        {"run_id": run_id, "rows": len(item_ids)},
+    )
+    return len(item_ids)
+
+
+def plan_retention(conn, keep: int) -> tuple[list[uuid.UUID], list[uuid.UUID]]:
+    """
+    Runs to compact and runs to delete when keeping the active run and the
+    newest `keep` runs. A kept delta run whose chain reaches a deleted run is
+    compacted first; compacting the oldest kept runs first shortens the
+    chains of the newer ones.
+    """
+    runs = conn.execute(
+        text(
+            """
+            SELECT cluster_run_id, base_run_id, is_active
+            FROM cluster_run
+            ORDER BY created_at DESC, id DESC
+            """
+        )
+    ).fetchall()
+
+    kept = {row.cluster_run_id for i, row in enumerate(runs) if i < keep or row.is_active}
+    base_of = {row.cluster_run_id: row.base_run_id for row in runs}
+
+    to_compact = []
+    for row in reversed(runs):
+        if row.cluster_run_id not in kept:
+            continue
+        base = base_of[row.cluster_run_id]
+        while base in kept:
+            base = base_of[base]
+        if base is not None:
+            to_compact.append(row.cluster_run_id)
+            base_of[row.cluster_run_id] = None
+
+    to_delete = [row.cluster_run_id for row in runs if row.cluster_run_id not in kept]
+    return to_compact, to_delete
+
+
+def delete_runs(conn, run_ids: list[uuid.UUID]):
+    """Drop the runs' partitions and records; no row-by-row DELETE, nothing to vacuum."""
+    if not run_ids:
+        return
+    for run_id in run_ids:
+        drop_snapshot_partition(conn, run_id)
+        # Runs linked with cluster_centroids off have no centroid partition
+        conn.execute(text(f"DROP TABLE IF EXISTS {centroid_partition(run_id)}"))
+    conn.execute(
+        text("DELETE FROM cluster_run WHERE cluster_run_id = ANY(:run_ids)"),
+        {"run_ids": run_ids},
+    )
@@ -0,0 +1,91 @@
+"""Connected components over integer item ids, backed by NumPy arrays."""
+import numpy as np
+
+
+class ArrayUnionFind:
+    """
+    Union-find over a fixed set of item ids. Edges are merged in chunks with
+    vectorised hooking and pointer jumping; every root is the smallest index of
+    its component, so items with no edges stay singletons for free.
+    """
+
+    def __init__(self, item_ids: np.ndarray):
+        self.item_ids = np.unique(np.asarray(item_ids, dtype=np.int64))
+        self.parent = np.arange(len(self.item_ids), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def index_of(self, ids: np.ndarray) -> np.ndarray:
+        """Positions of ids in item_ids; ids outside the set map to -1."""
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.item_ids, ids)
+        pos[pos == len(self.item_ids)] = 0
+        return np.where(self.item_ids[pos] == ids, pos, -1)
+
+    def find(self, idx: np.ndarray) -> np.ndarray:
+        roots = self.parent[idx]
+        while True:
+            next_roots = self.parent[roots]
+            if np.array_equal(next_roots, roots):
+                return roots
+            roots = next_roots
+
+    def _compress(self):
+        """Pointer jumping over the whole array until every item points at its root."""
+        while True:
+            grand = self.parent[self.parent]
+            if np.array_equal(grand, self.parent):
+                return
+            self.parent = grand
+
+    def union(self, edges: np.ndarray):
+        """Merge an (n, 2) array of item id pairs. Pairs with unknown ids are ignored."""
+        if len(edges) == 0:
+            return
+
+        a = self.index_of(edges[:, 0])
+        b = self.index_of(edges[:, 1])
+        known = (a >= 0) & (b >= 0)
+        a, b = a[known], b[known]
+
+        while len(a):
+            ra, rb = self.find(a), self.find(b)
+            pending = ra != rb
+            if not pending.any():
+                break
+            a, b = a[pending], b[pending]
+            lo = np.minimum(ra[pending], rb[pending])
+            hi = np.maximum(ra[pending], rb[pending])
+            # Hook every larger root under the smallest root it meets; roots
+            # hooked to a larger one than that merge on the next pass
+            np.minimum.at(self.parent, hi, lo)
+            # Trees stay one level deep, so find is a single lookup
+            self._compress()
+
+    def union_groups(self, group_ids: np.ndarray, item_ids: np.ndarray):
+        """Merge items sharing a group id, e.g. the clusters of a previous run."""
+        if len(item_ids) == 0:
+            return
+
+        order = np.lexsort((item_ids, group_ids))
+        group_ids, item_ids = group_ids[order], item_ids[order]
+        # Link every member to its group's smallest item, a star rather than a chain
+        starts = np.concatenate(([True], group_ids[1:] != group_ids[:-1]))
+        first = item_ids[np.maximum.accumulate(np.where(starts, np.arange(len(item_ids)), 0))]
+        self.union(np.column_stack((first[~starts], item_ids[~starts])))
+
+    def components(self) -> np.ndarray:
+        """Root index per item, fully compressed."""
+        self._compress()
+        return self.parent
+
+    def forest(self) -> np.ndarray:
+        """(n, 2) item id pairs linking every non-root item to its root; same components, fewest edges."""
+        roots = self.components()
+        linked = roots != np.arange(len(roots))
+        return np.column_stack((self.item_ids[linked], self.item_ids[roots[linked]]))
+
+    def labels(self) -> np.ndarray:
+        """Cluster id per item: the smallest item id in its component."""
+        return self.item_ids[self.components()]
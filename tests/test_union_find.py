@@ -0,0 +1,74 @@
+import time
+import unittest
+
+import numpy as np
+
+from services.union_find import ArrayUnionFind
+
+
+class ArrayUnionFindTest(unittest.TestCase):
+    def test_long_path(self):
+        ids = np.arange(200_000)
+        components = ArrayUnionFind(ids)
+        # Highest pair first, so every hook lands on a root that is hooked next
+        edges = np.column_stack((ids[:-1], ids[1:]))[::-1]
+
+        start = time.perf_counter()
+        components.union(edges)
+        seconds = time.perf_counter() - start
+
+        self.assertTrue((components.labels() == 0).all())
+        self.assertLess(seconds, 5.0)
+
+    def test_hub_with_highest_id(self):
+        leaves = np.arange(100_000)
+        hub = leaves[-1] + 1
+        components = ArrayUnionFind(np.append(leaves, hub))
+
+        start = time.perf_counter()
+        components.union(np.column_stack((leaves, np.full(len(leaves), hub))))
+        seconds = time.perf_counter() - start
+
+        self.assertTrue((components.labels() == 0).all())
+        self.assertLess(seconds, 5.0)
+
+    def test_union_groups(self):
+        item_ids = np.arange(10, 40)
+        group_ids = np.repeat([7, 3, 5], 10)
+        components = ArrayUnionFind(np.append(item_ids, 99))
+        components.union_groups(group_ids, item_ids)
+
+        labels = dict(zip(components.item_ids.tolist(), components.labels().tolist()))
+        self.assertEqual({labels[i] for i in range(10, 20)}, {10})
+        self.assertEqual({labels[i] for i in range(20, 30)}, {20})
+        self.assertEqual({labels[i] for i in range(30, 40)}, {30})
+        self.assertEqual(labels[99], 99)
+
+    def test_matches_sequential_union_find(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            ids = rng.choice(10_000, 300, replace=False)
+            edges = ids[rng.integers(0, len(ids), (250, 2))]
+
+            components = ArrayUnionFind(ids)
+            for chunk in np.array_split(edges, 4):
+                components.union(chunk)
+
+            parent = {int(i): int(i) for i in ids}
+
+            def find(x):
+                while parent[x] != x:
+                    x = parent[x]
+                return x
+
+            for a, b in edges.tolist():
+                ra, rb = find(a), find(b)
+                parent[max(ra, rb)] = min(ra, rb)
+
+            labels = dict(zip(components.item_ids.tolist(), components.labels().tolist()))
+            for item in ids.tolist():
+                self.assertEqual(labels[item], find(item))
+
+
+if __name__ == "__main__":
+    unittest.main()
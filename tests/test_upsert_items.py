@@ -0,0 +1,113 @@
+import csv
+import io
+import unittest
+import uuid
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, text
+
+from core.config import settings
+from core.database import create_db_and_tables, engine
+from services.item import upsert_items
+
+HEADER = ["sku", "nome_do_item", "fabricante", "caracteristicas", "valor", "ncm", "unidade_medida", "estoque"]
+
+
+def supplier_csv(rows: list[list]) -> io.BytesIO:
+    text_file = io.StringIO()
+    writer = csv.writer(text_file)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return io.BytesIO(text_file.getvalue().encode("utf-8"))
+
+
+def item_row(sku: str, price: str = "10.50") -> list:
+    return [sku, f"Parafuso {sku}", "Acme", f"Parafuso sextavado de aço zincado, lote {sku}", price, "7318", "UN", "5"]
+
+
+class UpsertItemsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except OperationalError:
+            raise unittest.SkipTest("PostgreSQL is not reachable")
+        cls.embedding_provider = settings.embedding_provider
+        settings.embedding_provider = "local"
+        create_db_and_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        settings.embedding_provider = cls.embedding_provider
+
+    def setUp(self):
+        self.supplier = f"test-{uuid.uuid4().hex}"
+
+    def tearDown(self):
+        with Session(engine) as db:
+            db.exec(text("DELETE FROM raw_item WHERE supplier = :supplier"), params={"supplier": self.supplier})
+            db.commit()
+
+    def upsert(self, file: io.BytesIO, copy_format: str = "csv") -> dict:
+        with Session(engine) as db:
+            return upsert_items(db, file, copy_format, self.supplier)
+
+    def stored_rows(self) -> int:
+        with Session(engine) as db:
+            return db.exec(
+                text("SELECT COUNT(*) FROM raw_item WHERE supplier = :supplier"), params={"supplier": self.supplier}
+            ).scalar_one()
+
+    def test_file_larger_than_read_buffer(self):
+        for copy_format in ("csv", "binary"):
+            with self.subTest(copy_format=copy_format):
+                file = supplier_csv([item_row(f"SKU-{i:05d}") for i in range(1_000)])
+                self.assertGreater(len(file.getvalue()), 8 * 1024)
+
+                counts = self.upsert(file, copy_format)
+
+                self.assertEqual(counts["rows"], 1_000)
+                self.assertEqual(counts["inserted"] + counts["unchanged"], 1_000)
+                self.assertEqual(self.stored_rows(), 1_000)
+
+    def test_last_row_of_repeated_business_id_wins(self):
+        rows = [item_row(f"SKU-{i:05d}") for i in range(500)]
+        self.upsert(supplier_csv(rows))
+
+        rows.append(item_row("SKU-00001", price="99.90"))
+        rows.append(item_row("SKU-00002", price="99.90"))
+        rows.append(item_row("SKU-00002"))
+        counts = self.upsert(supplier_csv(rows))
+
+        self.assertEqual(counts["rows"], 503)
+        self.assertEqual(counts["superseded"], 3)
+        self.assertEqual(counts["updated"], 1)
+        self.assertEqual(counts["unchanged"], 499)
+        self.assertEqual(self.stored_rows(), 500)
+        with Session(engine) as db:
+            price = db.exec(
+                text("SELECT price FROM raw_item WHERE supplier = :supplier AND business_id = 'SKU-00001'"),
+                params={"supplier": self.supplier},
+            ).scalar_one()
+        self.assertEqual(float(price), 99.90)
+
+    def test_reupload_is_a_no_op(self):
+        rows = [item_row(f"SKU-{i:05d}") for i in range(300)]
+        self.upsert(supplier_csv(rows))
+
+        counts = self.upsert(supplier_csv(rows))
+
+        self.assertEqual((counts["inserted"], counts["updated"], counts["unchanged"]), (0, 0, 300))
+        with Session(engine) as db:
+            missing = db.exec(
+                text(
+                    "SELECT COUNT(*) FROM raw_item WHERE supplier = :supplier AND name_description_embedding IS NULL"
+                ),
+                params={"supplier": self.supplier},
+            ).scalar_one()
+        self.assertEqual(missing, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()